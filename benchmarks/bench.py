@@ -0,0 +1,458 @@
+"""
+ベンチマーク：合成データ（冊子PDF・template.json・OCR CSV・設問マスタ・分割ツール用CSV）を作り、
+主要な処理の所要時間を測って JSON に残す。コミット間の比較用。
+
+    python benchmarks/bench.py                       # 既定の規模で全部
+    python benchmarks/bench.py --respondents 500 --only render,validate
+    python benchmarks/bench.py --compare benchmarks/results/bench_xxx.json
+    python benchmarks/bench.py --only splitter --split-cols 1200 --split-workers 4
+
+処理本体は enq_core から直接呼ぶ。分割ツール（survey_data_splitter*.py）は関数単体に加えて、
+AppTest でスクリプトごと実行した時間（読み込み・表示込み）も測る。
+
+startup は各ツールをアップロード前の状態で新しいプロセスから1回実行し、初回表示までの時間と
+その時点で読み込まれた重いモジュールを記録する（STARTUP_BUDGET_MS を超えたら警告）。
+"""
+import argparse
+import json
+import logging
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import fitz  # PyMuPDF  # noqa: E402
+
+from enq_core.markdown import generate_markdown  # noqa: E402
+from enq_core.numbering import add_numbering_with_fitz  # noqa: E402
+from enq_core.overlay import build_overlay_layer, draw_overlay_boxes  # noqa: E402
+from enq_core.render import render_page  # noqa: E402
+from enq_core.splitters import split_multi_answers, split_number_text  # noqa: E402
+from enq_core.validate import FlagTable, build_meta, flag_cell  # noqa: E402
+
+CASES = ("render", "overlay", "validate", "splitter", "numbering", "markdown", "startup")
+
+# アップロード前の初回表示（新しいプロセス・streamlit は読み込み済み）にかけてよい時間。
+# st.write だけの空のスクリプトでも 200ms 前後かかるので、それ＋ウィジェットの分。
+STARTUP_BUDGET_MS = 500
+STARTUP_SCRIPTS = (
+    "enq_page_reviewer_upload5.py", "survey_data_splitter.py", "survey_data_splitter2.py",
+    "survey_data_splitter3.py", "qpp_mdmaker.py", "md抽出.py", "enq_number02.py",
+)
+# 初回表示では読み込まないはずのモジュール
+HEAVY_MODULES = ("fitz", "pandas", "numpy", "PIL", "chardet", "pyarrow", "scipy")
+
+# =========================
+# 合成データ
+# =========================
+
+def make_template(pages_per_resp: int, cover_pages: int, questions_per_page: int) -> dict:
+    """論理ページごとに設問枠を縦に並べた template.json 相当。"""
+    pages = {}
+    n_logical = pages_per_resp - cover_pages
+    h = 0.8 / questions_per_page
+    for p in range(1, n_logical + 1):
+        pages[str(p)] = {
+            f"Q{p}_{k + 1}": [0.08, 0.1 + k * h, 0.92, 0.1 + (k + 0.8) * h]
+            for k in range(questions_per_page)
+        }
+    return {"pages": pages}
+
+def make_booklet(path: Path, template: dict, n_resp: int, pages_per_resp: int, cover_pages: int):
+    """回答者 n_resp 人分の冊子PDF（表紙＋設問ページ、枠と番号を描いたもの）。"""
+    doc = fitz.open()
+    for r in range(n_resp):
+        for c in range(cover_pages):
+            page = doc.new_page()
+            page.insert_text((72, 100), f"{r + 1:04d}", fontsize=32)
+        for p in range(1, pages_per_resp - cover_pages + 1):
+            page = doc.new_page()
+            w, h = page.rect.width, page.rect.height
+            for qid, (x0, y0, x1, y1) in template["pages"].get(str(p), {}).items():
+                page.draw_rect(fitz.Rect(x0 * w, y0 * h, x1 * w, y1 * h), color=(0, 0, 0), width=0.8)
+                page.insert_text((x0 * w + 4, y0 * h + 12), qid, fontsize=9)
+                for k in range(5):
+                    cx = x0 * w + 60 + k * 50
+                    page.draw_circle((cx, (y0 + y1) / 2 * h), 8, color=(0, 0, 0), width=0.6)
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+
+def make_ocr_and_master(template: dict, n_resp: int, rng: random.Random) -> tuple[pd.DataFrame, pd.DataFrame]:
+    qids = [q for qmap in template["pages"].values() for q in qmap]
+    types = {q: ("single", "multi", "other")[i % 3] for i, q in enumerate(qids)}
+    values = ["1", "2", "3", "4", "5", "1,3", "2,4", "", "9", "x"]
+    weights = [20, 20, 15, 10, 10, 6, 6, 6, 4, 3]
+    data = {"回答者番号": [str(i + 1) for i in range(n_resp)]}
+    for q in qids:
+        data[q] = rng.choices(values, weights, k=n_resp)
+    master = pd.DataFrame({
+        "設問ID": qids,
+        "設問文": [f"設問 {q}" for q in qids],
+        "形式": "",
+        "type": [types[q] for q in qids],
+        "選択肢": "1:a|2:b|3:c|4:d|5:e",
+    })
+    return pd.DataFrame(data), master
+
+def make_splitter_csv(n_rows: int, n_cols: int, rng: random.Random) -> pd.DataFrame:
+    """3つの分割ツールが拾う形式（数値:テキスト / 数値;テキスト / 1;3;5）を混ぜたCSV。"""
+    texts = ["外国人が増えすぎていること", "交通の便が悪い", "特になし", "子育て支援を充実してほしい"]
+
+    def cell():
+        r = rng.random()
+        if r < 0.45:
+            return str(rng.randint(1, 9))
+        if r < 0.6:
+            return f"{rng.randint(1, 14)}:{rng.choice(texts)}"
+        if r < 0.75:
+            return f"{rng.randint(1, 14)};{rng.choice(texts)}"
+        if r < 0.9:
+            return ";".join(str(v) for v in sorted(rng.sample(range(1, 10), rng.randint(2, 4))))
+        return ""
+
+    data = {"ID": list(range(1, n_rows + 1))}
+    for j in range(n_cols):
+        data[f"Q{j + 1}"] = [cell() for _ in range(n_rows)]
+    return pd.DataFrame(data)
+
+def make_question_sheets(n_questions: int, rng: random.Random) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """qpp_mdmaker 用の Questions / Choices シート。"""
+    q_rows, c_rows = [], []
+    for i in range(n_questions):
+        qkey = f"q{i + 1}"
+        q_rows.append({
+            "qid": f"Q{i + 1}", "qkey": qkey, "q_level": 2 + (i % 3 == 2), "question": f"設問文 {i + 1}",
+            "type": rng.choice(["SA", "MA", "FA"]), "var_name": f"v{i + 1}", "instruction": "",
+            "show_if": "", "tags": "a,b" if i % 4 == 0 else "",
+        })
+        for k in range(rng.randint(2, 8)):
+            c_rows.append({"qkey": qkey, "choice_no": k + 1, "choice_value": k + 1, "choice_label": f"選択肢{k + 1}"})
+    rng.shuffle(c_rows)
+    return pd.DataFrame(q_rows), pd.DataFrame(c_rows)
+
+# =========================
+# AppTest
+# =========================
+
+def _quiet_streamlit():
+    # bare mode / 非推奨引数の警告で結果が埋もれないように
+    from streamlit import config
+
+    config.set_option("logger.level", "error")
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith("streamlit"):
+            logging.getLogger(name).setLevel(logging.ERROR)
+
+class _Upload(BytesIO):
+    """AppTest 用のアップロード済みファイルの代わり。"""
+
+    def __init__(self, name: str, data: bytes):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+        self.file_id = name
+        self.type = "text/csv"
+
+def run_script_with_upload(script: Path, upload: _Upload, button_label: str, timeout: float = 600):
+    """アップロード済みの状態でスクリプトを実行し、button_label のボタンを押した再実行の時間を返す。"""
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    orig = st.file_uploader
+    st.file_uploader = lambda *a, **k: _Upload(upload.name, upload.getvalue())
+    try:
+        _quiet_streamlit()
+        at = AppTest.from_file(str(script), default_timeout=timeout)
+        at.run()
+        btn = [b for b in at.button if b.label == button_label]
+        if not btn:
+            raise RuntimeError(f"{script.name}: ボタン {button_label!r} が見つかりません")
+        t0 = time.perf_counter()
+        btn[0].click().run()
+        elapsed = time.perf_counter() - t0
+        if at.exception:
+            raise RuntimeError(f"{script.name}: {at.exception[0].message}")
+        return elapsed
+    finally:
+        st.file_uploader = orig
+
+_STARTUP_PROBE = """
+import json, logging, sys, time
+from streamlit import config
+from streamlit.testing.v1 import AppTest
+
+config.set_option("logger.level", "error")
+for name in list(logging.root.manager.loggerDict):
+    if name.startswith("streamlit"):
+        logging.getLogger(name).setLevel(logging.ERROR)
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+t0 = time.perf_counter()
+at.run()
+elapsed = time.perf_counter() - t0
+print(json.dumps({
+    "seconds": elapsed,
+    "error": at.exception[0].message if at.exception else "",
+    "heavy": [m for m in sys.argv[2].split(",") if m in sys.modules],
+}))
+"""
+
+def run_startup_probe(script: Path) -> dict:
+    """新しいプロセスで script をアップロード前の状態で1回実行する（import はすべて冷えた状態）。"""
+    proc = subprocess.run(
+        [sys.executable, "-c", _STARTUP_PROBE, str(script), ",".join(HEAVY_MODULES)],
+        cwd=ROOT, capture_output=True, text=True, timeout=300,
+    )
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        raise RuntimeError(f"{script.name}: {proc.stderr.strip()[-500:]}")
+    ret = json.loads(lines[-1])
+    if ret["error"]:
+        raise RuntimeError(f"{script.name}: {ret['error']}")
+    return ret
+
+# =========================
+# 計測
+# =========================
+
+def measure(fn, repeat: int, units: int = 1) -> dict:
+    """fn を repeat 回実行した秒数の統計（ms）。fn が秒数を返した場合はそれを使う。"""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        ret = fn()
+        times.append(ret if isinstance(ret, float) else time.perf_counter() - t0)
+    ms = [t * 1000 for t in times]
+    return {
+        "repeat": repeat,
+        "units": units,
+        "min_ms": round(min(ms), 3),
+        "median_ms": round(statistics.median(ms), 3),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "per_unit_us": round(min(ms) * 1000 / max(1, units), 3),
+    }
+
+def bench_render(data: dict, args) -> dict:
+    doc = fitz.open(data["pdf"])
+    pages = list(range(min(len(doc), args.render_pages)))
+
+    def run():
+        for i in pages:
+            render_page(doc, i, args.dpi)
+
+    return {f"render_page@{args.dpi}dpi": measure(run, args.repeat, len(pages))}
+
+def bench_overlay(data: dict, args) -> dict:
+    doc = fitz.open(data["pdf"])
+    img = render_page(doc, args.cover_pages, args.dpi)
+    qid_to_bbox = data["template"]["pages"]["1"]
+    row = data["ocr"].iloc[0]
+    qid_to_value = {q: row[q] for q in qid_to_bbox}
+    kw = dict(qid_to_bbox=qid_to_bbox, qid_to_value=qid_to_value, show_labels=True, show_values=True,
+              value_font_size=48, value_alpha=80, value_max_chars=12)
+    layer = build_overlay_layer(qid_to_bbox, *img.size, show_labels=True)
+    return {
+        "draw_overlay_boxes": measure(lambda: draw_overlay_boxes(img, **kw), args.repeat, len(qid_to_bbox)),
+        "draw_overlay_boxes(cached layer)": measure(
+            lambda: draw_overlay_boxes(img, layer=layer, **kw), args.repeat, len(qid_to_bbox)
+        ),
+    }
+
+def bench_validate(data: dict, args) -> dict:
+    df, meta = data["ocr"], build_meta(data["master"])
+    cols = [c for c in df.columns if c != "回答者番号"]
+    values = df[cols].to_numpy()
+
+    def per_cell():
+        for i in range(values.shape[0]):
+            for j, q in enumerate(cols):
+                flag_cell(q, values[i, j], meta)
+
+    n = values.size
+    return {
+        "flag_cell(loop)": measure(per_cell, args.repeat, n),
+        "FlagTable": measure(lambda: FlagTable(df, meta), args.repeat, n),
+    }
+
+def bench_splitter(data: dict, args) -> dict:
+    raw = data["split_csv"].to_csv(index=False).encode("utf-8-sig")
+    df = pd.read_csv(BytesIO(raw), encoding="utf-8-sig")  # アプリと同じ読み込み方（空欄は NaN）
+    out = {
+        "split_number_text(:)": measure(lambda: split_number_text(df, ":"), args.repeat, df.size),
+        "split_number_text(;)": measure(lambda: split_number_text(df, ";"), args.repeat, df.size),
+        "split_multi_answers": measure(lambda: split_multi_answers(df), args.repeat, df.size),
+    }
+    if args.split_workers > 1:
+        w = args.split_workers
+        out[f"split_number_text(:) workers={w}"] = measure(
+            lambda: split_number_text(df, ":", workers=w), args.repeat, df.size)
+        out[f"split_multi_answers workers={w}"] = measure(
+            lambda: split_multi_answers(df, workers=w), args.repeat, df.size)
+    upload = _Upload("bench.csv", raw)
+    for name in ("survey_data_splitter.py", "survey_data_splitter2.py", "survey_data_splitter3.py"):
+        script = ROOT / name
+        if script.exists():
+            out[f"{script.stem}(script)"] = measure(
+                lambda: run_script_with_upload(script, upload, "🔄 データを処理する"),
+                args.repeat, data["split_csv"].size,
+            )
+    return out
+
+def bench_numbering(data: dict, args) -> dict:
+    pdf_bytes = Path(data["pdf"]).read_bytes()
+    return {"add_numbering_with_fitz": measure(
+        lambda: add_numbering_with_fitz(pdf_bytes, args.pages_per_resp, 1), args.repeat, args.respondents
+    )}
+
+def bench_markdown(data: dict, args) -> dict:
+    q, c = data["questions"], data["choices"]
+    return {"generate_markdown": measure(lambda: generate_markdown(q, c), args.repeat, len(q))}
+
+def bench_startup(data: dict, args) -> dict:
+    out = {}
+    for name in STARTUP_SCRIPTS:
+        script = ROOT / name
+        if not script.exists():
+            continue
+        probes = []
+
+        def run():
+            probes.append(run_startup_probe(script))
+            return probes[-1]["seconds"]
+
+        r = measure(run, args.repeat)
+        r["budget_ms"] = STARTUP_BUDGET_MS
+        r["over_budget"] = r["min_ms"] > STARTUP_BUDGET_MS
+        r["heavy_modules"] = probes[-1]["heavy"]
+        out[f"startup:{script.stem}"] = r
+    return out
+
+BENCHES = {
+    "render": bench_render,
+    "overlay": bench_overlay,
+    "validate": bench_validate,
+    "splitter": bench_splitter,
+    "numbering": bench_numbering,
+    "markdown": bench_markdown,
+    "startup": bench_startup,
+}
+
+# =========================
+# Main
+# =========================
+
+def git_info() -> dict:
+    def git(*a):
+        try:
+            return subprocess.run(["git", *a], cwd=ROOT, capture_output=True, text=True, timeout=30).stdout.strip()
+        except Exception:
+            return ""
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+def versions() -> dict:
+    import PIL
+    import streamlit
+    return {
+        "python": platform.python_version(), "platform": platform.platform(),
+        "pandas": pd.__version__, "numpy": np.__version__, "pymupdf": fitz.VersionBind,
+        "pillow": PIL.__version__, "streamlit": streamlit.__version__,
+    }
+
+def build_data(args, data_dir: Path) -> dict:
+    rng = random.Random(args.seed)
+    template = make_template(args.pages_per_resp, args.cover_pages, args.questions_per_page)
+    pdf = data_dir / "booklet.pdf"
+    make_booklet(pdf, template, args.respondents, args.pages_per_resp, args.cover_pages)
+    ocr, master = make_ocr_and_master(template, args.respondents, rng)
+    questions, choices = make_question_sheets(args.md_questions, rng)
+    split_csv = make_splitter_csv(args.split_rows, args.split_cols, rng)
+    (data_dir / "template.json").write_text(json.dumps(template, ensure_ascii=False), encoding="utf-8")
+    ocr.to_csv(data_dir / "ocr.csv", index=False, encoding="utf-8-sig")
+    master.to_csv(data_dir / "master.csv", index=False, encoding="utf-8-sig")
+    split_csv.to_csv(data_dir / "split.csv", index=False, encoding="utf-8-sig")
+    questions.to_csv(data_dir / "questions.csv", index=False, encoding="utf-8")
+    choices.to_csv(data_dir / "choices.csv", index=False, encoding="utf-8")
+    return {"pdf": str(pdf), "template": template, "ocr": ocr, "master": master,
+            "split_csv": split_csv, "questions": questions, "choices": choices}
+
+def compare(current: dict, baseline_path: str):
+    base = json.loads(Path(baseline_path).read_text(encoding="utf-8"))["results"]
+    print(f"\n比較（基準: {baseline_path}）  比 = 今回 / 基準（小さいほど速い）")
+    for name, r in current.items():
+        b = base.get(name)
+        if b:
+            print(f"  {name:40s} {b['min_ms']:10.1f} → {r['min_ms']:10.1f} ms  ×{r['min_ms'] / max(b['min_ms'], 1e-9):.2f}")
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="合成データで主要処理の時間を測る")
+    ap.add_argument("--only", default=",".join(CASES), help=f"実行するケース（{','.join(CASES)}）")
+    ap.add_argument("--respondents", type=int, default=50)
+    ap.add_argument("--pages-per-resp", type=int, default=16)
+    ap.add_argument("--cover-pages", type=int, default=1)
+    ap.add_argument("--questions-per-page", type=int, default=8)
+    ap.add_argument("--render-pages", type=int, default=8, help="render で描くページ数")
+    ap.add_argument("--dpi", type=int, default=220)
+    ap.add_argument("--split-rows", type=int, default=2000)
+    ap.add_argument("--split-cols", type=int, default=20)
+    ap.add_argument("--split-workers", type=int, default=1,
+                    help="2以上なら分割を列の並列処理でも測る（--split-cols 200 以上で並列になる）")
+    ap.add_argument("--md-questions", type=int, default=300)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--data-dir", help="合成データの置き場（省略時は一時ディレクトリ）")
+    ap.add_argument("--out", default=str(ROOT / "benchmarks" / "results"), help="結果JSONの出力先")
+    ap.add_argument("--compare", help="比較する過去の結果JSON")
+    args = ap.parse_args(argv)
+
+    cases = [c.strip() for c in args.only.split(",") if c.strip()]
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        ap.error(f"unknown case: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(args.data_dir or tmp)
+        data_dir.mkdir(parents=True, exist_ok=True)
+        t0 = time.perf_counter()
+        data = build_data(args, data_dir)
+        print(f"合成データ作成 {time.perf_counter() - t0:.1f} 秒（{data_dir}）")
+
+        results = {}
+        for case in cases:
+            for name, r in BENCHES[case](data, args).items():
+                results[name] = r
+                print(f"  {name:40s} min {r['min_ms']:10.1f} ms  median {r['median_ms']:10.1f} ms"
+                      f"  ({r['per_unit_us']:.1f} µs/unit × {r['units']})")
+                if r.get("over_budget"):
+                    print(f"    ⚠ 予算 {r['budget_ms']} ms 超過（読み込み済み: {', '.join(r['heavy_modules']) or 'なし'}）")
+
+    git = git_info()
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git": git,
+        "versions": versions(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "data_dir")},
+        "results": results,
+    }
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    path = out / f"bench_{datetime.now():%Y%m%d_%H%M%S}_{git['commit'][:7] or 'nogit'}.json"
+    path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"結果: {path}")
+
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
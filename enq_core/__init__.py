@@ -0,0 +1,54 @@
+"""
+アンケート処理の共通ライブラリ（Streamlit に依存しない）。
+
+各ツール（*.py の Streamlit アプリ・CLI）はここの関数を呼ぶだけの薄い画面にする。
+
+- validate   : OCR CSV・設問マスタの読み込み、⚠ 判定（FlagTable）
+- review     : ページレビューの対応表・修正キュー・journal
+- render     : PDFページのラスタライズ、ページ画像キャッシュ・先読み・書き出し
+- overlay    : 照合オーバーレイ（赤枠・問番号・OCR値）、サムネイルのバッジ
+- encoding   : CSVの文字コード判定（BOM・UTF-8 の確認と抜き取り判定、結果はキャッシュ）
+- tableio    : CSV / Parquet / Feather の読み書き（pyarrow があるとき）
+- splitters  : 「数値:テキスト」分割、「;」複数回答の展開（位置ごとの列 / 選択肢ごとの 0/1 列）
+- numbering  : 調査票PDFへの通し番号
+- markdown   : 設問定義 Markdown の生成、見出しの抽出
+- perf       : 処理時間の計測
+- procs      : アプリから作るプロセスプールの起動方法（forkserver）
+
+サブモジュールは使うときに初めて読み込む（`from enq_core import render_page` の時点で render だけ）。
+PyMuPDF・pandas・Pillow の import は合わせて1秒近くかかるので、使わないツールには読み込ませない。
+"""
+import importlib
+
+# 公開名 → 定義しているサブモジュール
+_EXPORTS = {
+    "extract_headings": "markdown", "generate_markdown": "markdown", "load_sheet": "markdown",
+    "detect_encoding": "encoding",
+    "add_numbering_with_fitz": "numbering",
+    "badge_thumbnail": "overlay", "build_overlay_layer": "overlay", "draw_overlay_boxes": "overlay",
+    "load_font": "overlay",
+    "PageCache": "render", "PagePrefetcher": "render", "PageStore": "render", "export_pages": "render",
+    "render_page": "render",
+    "RespondentIndex": "review", "append_journal": "review", "build_global_queue": "review",
+    "build_page_map": "review", "df_digest": "review", "page_flag_counts": "review",
+    "read_journal": "review", "replay_journal": "review",
+    "TableWriter": "tableio", "read_table": "tableio", "table_to_bytes": "tableio", "write_table": "tableio",
+    "dummy_multi_answers": "splitters", "read_csv_auto": "splitters", "split_multi_answers": "splitters",
+    "split_number_text": "splitters",
+    "REASON_LABELS": "validate", "FlagTable": "validate", "build_meta": "validate",
+    "build_qid_to_page": "validate", "check_value": "validate", "flag_cell": "validate",
+    "read_master_csv": "validate", "read_ocr_csv": "validate",
+}
+
+__all__ = sorted(_EXPORTS)
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value  # 2回目からは普通の属性として引ける
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,125 @@
+"""
+CSVの文字コード判定。
+
+アップロードされたCSV全体に chardet をかけると 100MB で数十秒かかるので、次の順に決める。
+
+1. BOM があればそれに従う（utf-8-sig / utf-16）
+2. 全体が UTF-8 として厳密に読めれば utf-8（1MBずつ decode するだけなので速い）
+3. 先頭・UTF-8 で読めなくなった行・中央・末尾の SAMPLE_BYTES ずつを chardet（なければ charset-normalizer）で判定する
+
+結果は内容全体のダイジェスト（blake2b。レビュアーの upload_digest と同じ）ごとに覚えておくので、同じファイルの
+再実行では判定をやり直さない。一部だけのダイジェストにすると、窓の外だけが違うファイル（UTF-8 で
+読めない文字が途中に1つだけある等）に別のファイルの "utf-8" を返してしまう。
+"""
+import codecs
+import hashlib
+import threading
+from collections import OrderedDict
+
+# chardet に渡す窓1つあたりのバイト数（最大4か所）
+SAMPLE_BYTES = 64 * 1024
+_UTF8_BLOCK = 1 << 20
+# chardet の信頼度がこれより低ければ、cp932 で読めるかを先に確かめる
+LOW_CONFIDENCE = 0.5
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+# chardet の答えを、日本語のCSVで実際に読める上位互換の文字コードに寄せる（①・㈱ などの機種依存文字）
+_SUPERSETS = {"shift_jis": "cp932", "windows-31j": "cp932", "ascii": "utf-8"}
+
+_CACHE_SIZE = 32
+_cache: OrderedDict = OrderedDict()
+_cache_lock = threading.Lock()  # Streamlit のセッションごとのスレッドから同時に呼ばれる
+
+def _utf8_error_at(raw: memoryview) -> int | None:
+    """UTF-8 として読めなくなる最初のバイト位置（ブロック境界では数バイトずれる）。全体が読めれば None。"""
+    decoder = codecs.getincrementaldecoder("utf-8")("strict")
+    pos = 0
+    try:
+        for pos in range(0, len(raw), _UTF8_BLOCK):
+            decoder.decode(raw[pos:pos + _UTF8_BLOCK])
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError as e:
+        return pos + e.start
+    return None
+
+def _window(raw: memoryview, start: int) -> bytes:
+    """start から SAMPLE_BYTES。行の途中で始まる・終わる分は落とす（マルチバイト文字の途中で切らない）。"""
+    w = bytes(raw[start:start + SAMPLE_BYTES])
+    if start + SAMPLE_BYTES < len(raw):
+        end = w.rfind(b"\n")
+        w = w[:end + 1] if end >= 0 else w
+    if start > 0:
+        nl = w.find(b"\n")
+        w = w[nl + 1:] if nl >= 0 else w
+    return w
+
+def _sample(raw: memoryview, error_at: int) -> bytes:
+    """先頭・UTF-8 で読めなくなった行・中央・末尾の窓をつないだもの。"""
+    n = len(raw)
+    if n <= 4 * SAMPLE_BYTES:
+        return bytes(raw)
+    # 読めなくなった行を窓に入れないと、ほぼ ASCII のファイルで非ASCII文字が窓の外にしかないことがある
+    starts = [0, max(error_at - 1024, 0), (n - SAMPLE_BYTES) // 2, n - SAMPLE_BYTES]
+    return b"\n".join(_window(raw, start) for start in starts)
+
+def _decodes(sample: bytes, encoding: str) -> bool:
+    try:
+        sample.decode(encoding)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+def _guess(sample: bytes) -> tuple[str | None, float]:
+    try:
+        import chardet  # 判定を使うツールだけが読み込む
+    except ImportError:
+        from charset_normalizer import from_bytes
+
+        best = from_bytes(sample).best()
+        if best is None:
+            return None, 0.0
+        return best.encoding, 1.0 - best.chaos
+    detected = chardet.detect(sample)
+    return detected["encoding"], detected["confidence"] or 0.0
+
+def _detect(raw: memoryview) -> tuple[str, float]:
+    for bom, encoding in _BOMS:
+        if raw[:len(bom)] == bom:
+            return encoding, 1.0
+    error_at = _utf8_error_at(raw)
+    if error_at is None:
+        return "utf-8", 1.0
+    sample = _sample(raw, error_at)
+    encoding, confidence = _guess(sample)
+    encoding = _SUPERSETS.get((encoding or "").lower(), encoding)
+    # UTF-8 でないことは分かっているので、窓が ASCII だけ・判定不能なら日本語の既定に倒す。
+    # 非ASCII文字が少ないと chardet は Big5 などを低い信頼度で返すので、そのときも cp932 で読めればそちらにする
+    if not encoding or encoding == "utf-8":
+        return "cp932", confidence
+    if confidence < LOW_CONFIDENCE and encoding.lower() != "cp932" and _decodes(sample, "cp932"):
+        return "cp932", confidence
+    return encoding, confidence
+
+def _cache_key(raw: memoryview) -> bytes:
+    """内容全体のダイジェスト（ハッシュは 100MB でも 0.1 秒ほどで、判定よりずっと軽い）。"""
+    return hashlib.blake2b(raw, digest_size=16).digest()
+
+def detect_encoding(raw) -> tuple[str, float]:
+    """文字コードを判定する。(文字コード, 信頼度) を返す。raw は bytes / memoryview。"""
+    raw = memoryview(raw).cast("B")
+    key = _cache_key(raw)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    result = _detect(raw)  # 判定はロックの外で（同じファイルを同時に判定しても結果は同じ）
+    with _cache_lock:
+        _cache[key] = result
+        _cache.move_to_end(key)
+        if len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
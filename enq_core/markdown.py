@@ -0,0 +1,107 @@
+"""
+Markdown の生成・抽出（qpp_mdmaker*.py / md抽出.py の中身）。
+
+- load_sheet        : Questions / Choices シート（CSV または Excel）の読み込み
+- generate_markdown : 設問・選択肢から n8n と同じ形式の設問定義 Markdown を作る
+- extract_headings  : コードブロック外の見出し行（# で始まる行）を取り出す
+"""
+from io import BytesIO
+
+import pandas as pd
+
+from .encoding import detect_encoding
+
+def load_sheet(file) -> pd.DataFrame:
+    """CSV は文字コードを判定してから1回だけ読む。列名の前後の空白は落とす。"""
+    if file.name.endswith('.csv'):
+        raw = file.getvalue()
+        df = pd.read_csv(BytesIO(raw), encoding=detect_encoding(raw)[0])
+    else:
+        df = pd.read_excel(file)
+    df.columns = [c.strip() for c in df.columns]
+    return df
+
+def fmt_num(val):
+    """数値列のfloat表示（1.0等）を整数に変換する。"""
+    try:
+        f = float(val)
+        return str(int(f)) if f == int(f) else str(val)
+    except (ValueError, TypeError):
+        return str(val)
+
+def generate_markdown(questions: pd.DataFrame, choices: pd.DataFrame, int_choice_values: bool = False) -> str:
+    """int_choice_values=True なら選択肢の値 1.0 を 1 と書く。"""
+    md_output = "# 設問定義\n\n"
+
+    # 選択肢をqkeyでグループ化
+    choice_map = {}
+    for _, row in choices.iterrows():
+        key = str(row.get('qkey', '')).strip()
+        if not key: continue
+        if key not in choice_map: choice_map[key] = []
+        choice_map[key].append(row)
+
+    # 設問ループ
+    for _, q in questions.iterrows():
+        qid = str(q.get('qid', 'N/A'))
+        qkey = str(q.get('qkey', 'undefined'))
+        level = int(q['q_level']) if pd.notna(q.get('q_level')) else 2
+        title = str(q.get('question', ''))
+
+        # 見出し生成
+        header = "## " if level <= 2 else "### "
+        md_output += f"{header}{qid} {title}\n\n"
+
+        # YAMLブロック生成
+        md_output += f"```yaml {{# {qkey} .qmeta}}\n"
+        md_output += f"id: {qkey}\n"
+        md_output += f"qid: {qid}\n"
+        md_output += f"level: {level}\n"
+        md_output += f"type: {q.get('type', 'SA')}\n"
+
+        # 任意項目の追加
+        for col in ['var_name', 'instruction', 'show_if']:
+            val = q.get(col)
+            if pd.notna(val) and val != "":
+                md_output += f"{col}: {val}\n"
+
+        # tagsの処理
+        tags = q.get('tags')
+        if pd.notna(tags) and tags != "":
+            tag_list = [f'"{t.strip()}"' for t in str(tags).split(',')]
+            md_output += f"tags: [{', '.join(tag_list)}]\n"
+
+        # 選択肢の紐付
+        relevant = choice_map.get(qkey)
+        if relevant:
+            md_output += "choices:\n"
+            # choice_noがあればソート
+            relevant.sort(key=lambda x: x.get('choice_no', 0) if pd.notna(x.get('choice_no', 0)) else 0)
+            for c in relevant:
+                value = fmt_num(c.get("choice_value")) if int_choice_values else c.get("choice_value")
+                md_output += f'  "{value}": "{c.get("choice_label")}"\n'
+
+        md_output += "```\n\n"
+
+    return md_output
+
+def extract_headings(content: str) -> list[str]:
+    """
+    # で始まる行（見出し）を取り出す。
+    YAMLブロックなどのコードブロック（```）内にある # は無視する。
+    """
+    extracted_headings = []
+    is_inside_code_block = False
+
+    for line in content.splitlines():
+        # コードブロック（```）の開始・終了を判定
+        if line.strip().startswith("```"):
+            is_inside_code_block = not is_inside_code_block
+            continue
+
+        # コードブロック外で、かつ # で始まる行を抽出
+        if not is_inside_code_block:
+            if line.strip().startswith("#"):
+                extracted_headings.append(line)
+
+    return extracted_headings
@@ -0,0 +1,51 @@
+"""
+調査票PDFへの通し番号の書き込み（enq_number02.py の中身）。
+"""
+import fitz  # PyMuPDF
+
+def add_numbering_with_fitz(pdf_bytes, pages_per_doc, start_number):
+    """pages_per_doc ページごとの先頭ページ右上に 4桁の番号（start_number から）を書き込み、PDFのバイト列を返す。"""
+    # メモリ効率を考え、ストリームで開く
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    total_pages = len(doc)
+    num_docs = total_pages // pages_per_doc
+
+    for i in range(num_docs):
+        # 開始番号から採番（4桁表示）
+        current_number = start_number + i
+        doc_number_str = f"{current_number:04d}"
+
+        start_idx = i * pages_per_doc
+
+        if start_idx < total_pages:
+            page = doc[start_idx]
+            rect = page.rect  # 標準化されたA4サイズ (595 x 842)
+
+            # 再PDF化後の標準A4に合わせた右上の位置
+            # 右端から100pt、上端から50pt
+            text_x = rect.width - 100
+            text_y = 50
+
+            try:
+                # 最も安全な標準フォント（Helvetica）を使用
+                page.insert_text(
+                    (text_x, text_y),
+                    doc_number_str,
+                    fontsize=32,
+                    color=(0, 0, 0),
+                    fontname="helv",
+                    rotate=0,
+                    overlay=True
+                )
+            except Exception:
+                # 万が一フォント名でエラーが出る場合は、デフォルト設定で書き込む
+                page.insert_text(
+                    (text_x, text_y),
+                    doc_number_str,
+                    fontsize=32,
+                    rotate=0,
+                    overlay=True
+                )
+
+    # garbage=3 で不要なオブジェクトを削除し、deflate=True で圧縮
+    return doc.tobytes(garbage=3, deflate=True)
@@ -0,0 +1,184 @@
+"""
+ページ画像への照合オーバーレイ（赤枠・問番号・OCR値）とサムネイルのバッジ。
+
+bbox は template.json と同じ正規化座標（0..1）。
+"""
+from functools import lru_cache
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFont
+
+# ★ repo同梱フォント（GitHubに置いた実ファイル名に合わせる）
+BUNDLED_FONT = Path(__file__).resolve().parent.parent / "assets" / "fonts" / "NotoSansCJKjp-Regular.otf"
+
+FONT_CANDIDATES = [
+    str(BUNDLED_FONT),  # ★同梱フォントを最優先
+    "/usr/share/fonts/opentype/ipafont-gothic/ipag.ttf",
+    "/usr/share/fonts/truetype/fonts-japanese-gothic.ttf",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.otf",
+]
+
+def _text_wh(draw, text, font):
+    # Pillowのバージョン差に強い順で試す
+    if hasattr(draw, "textbbox"):
+        l, t, r, b = draw.textbbox((0, 0), text, font=font)
+        return (r - l), (b - t)
+    if hasattr(font, "getbbox"):
+        l, t, r, b = font.getbbox(text)
+        return (r - l), (b - t)
+    if hasattr(font, "getsize"):
+        return font.getsize(text)
+    # 最後の保険
+    return (len(text) * 10, 20)
+
+def clamp01(v: float) -> float:
+    return max(0.0, min(1.0, v))
+
+def denorm_bbox(b, w, h):
+    x0 = int(clamp01(float(b[0])) * w)
+    y0 = int(clamp01(float(b[1])) * h)
+    x1 = int(clamp01(float(b[2])) * w)
+    y1 = int(clamp01(float(b[3])) * h)
+    if x1 < x0:
+        x0, x1 = x1, x0
+    if y1 < y0:
+        y0, y1 = y1, y0
+    return x0, y0, x1, y1
+
+@lru_cache(maxsize=None)
+def load_font(size: int):
+    """候補を順に試して最初に読めたフォントを返す（サイズごとに1回だけ読み込む）。"""
+    for fp in FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(fp, size)
+        except Exception:
+            pass
+    return ImageFont.load_default()
+
+def _text_mask(text: str, font) -> Image.Image:
+    # (0,0) に描いたときと同じ位置関係のマスク（L）を作る
+    if hasattr(ImageDraw.ImageDraw, "textbbox"):
+        _, _, r, b = ImageDraw.Draw(Image.new("L", (1, 1))).textbbox((0, 0), text, font=font)
+    else:
+        r, b = _text_wh(ImageDraw.Draw(Image.new("L", (1, 1))), text, font)
+    mask = Image.new("L", (max(1, r), max(1, b)), 0)
+    ImageDraw.Draw(mask).text((0, 0), text, fill=255, font=font)
+    return mask
+
+def build_overlay_layer(qid_to_bbox: dict, w: int, h: int, show_labels: bool = True) -> list:
+    """
+    赤枠＋問番号の静的レイヤ。値に依存しないのでページ・画像サイズごとに使い回せる。
+    [{"qid", "box": (x0, y0, x1, y1), "label": (x, y, mask) or None}, ...]
+    """
+    font_label = load_font(32)
+    layer = []
+    i = 0
+    for qid, b in (qid_to_bbox or {}).items():
+        try:
+            x0, y0, x1, y1 = denorm_bbox(b, w, h)
+        except Exception:
+            continue
+
+        label = None
+        # 問番号ラベル（枠の右上：右寄せ）
+        if show_labels:
+            dy = (i % 3) * 36
+            mask = _text_mask(str(qid), font_label)
+            tw, th = _text_wh(ImageDraw.Draw(mask), str(qid), font_label)
+            pad = 4
+            x = x1 - pad - tw          # ← 右端から文字幅分だけ左へ
+            y = y0 + pad + dy
+            label = (x, y, mask)
+            i += 1
+
+        layer.append({"qid": qid, "box": (x0, y0, x1, y1), "label": label})
+    return layer
+
+def draw_overlay_boxes(
+    img: Image.Image,
+    qid_to_bbox: dict,
+    qid_to_value: dict | None = None,
+    show_labels: bool = True,
+    show_values: bool = False,
+    value_font_size: int = 48,
+    value_alpha: int = 80,   # 0..255（例：80=約31%）
+    value_max_chars: int = 12,
+    layer: list | None = None,
+) -> Image.Image:
+    """
+    - 赤枠＋問番号（show_labels）
+    - 枠内にOCR値を半透明で描画（show_values）
+    layer に build_overlay_layer() の結果（同じ画像サイズのもの）を渡すと、
+    赤枠＋問番号の準備を省いて値だけを描く。合成は文字の範囲だけで行う。
+    """
+    # ページ全体のRGBA化・合成はせず、RGBのコピーに直接描く
+    out = img.convert("RGB") if img.mode != "RGB" else img.copy()
+    w, h = out.size
+
+    if layer is None:
+        layer = build_overlay_layer(qid_to_bbox, w, h, show_labels)
+
+    draw = ImageDraw.Draw(out)
+    for item in layer:
+        # 赤枠（不透明なので合成不要）
+        draw.rectangle(list(item["box"]), outline=(255, 0, 0), width=3)
+        if item["label"] is not None:
+            x, y, mask = item["label"]
+            out.paste((255, 0, 0), (x, y, x + mask.width, y + mask.height), mask)
+
+    # 枠内OCR値（半透明）
+    if show_values and qid_to_value is not None:
+        font_value = load_font(value_font_size)
+        for item in layer:
+            raw = qid_to_value.get(item["qid"], "")
+            txt = "" if raw is None else str(raw).strip()
+            if txt == "":
+                txt = "空"  # 未回答を見落としにくくする
+
+            # 長い場合は省略（最適化はしない方針なので単純に切る）
+            if len(txt) > value_max_chars:
+                txt = txt[:value_max_chars] + "…"
+
+            # 枠の左寄り・上下中央に配置（枠が小さいと読めないがOK）
+            x0, y0, x1, y1 = item["box"]
+            mask = _text_mask(txt, font_value)
+            tw, th = _text_wh(ImageDraw.Draw(mask), txt, font_value)
+            cy = (y0 + y1) // 2
+            tx = x0 + 50
+            ty = cy - th // 2
+
+            # 半透明の黒：文字マスクに透明度を掛けて、その範囲だけ合成する
+            alpha_mask = mask.point(lambda v: v * value_alpha // 255)
+            out.paste((0, 0, 0), (tx, ty, tx + mask.width, ty + mask.height), alpha_mask)
+
+    return out
+
+def badge_thumbnail(thumb: Image.Image, checked: bool, n_flags: int, current: bool = False) -> Image.Image:
+    """
+    サムネイルに状態の枠とバッジを付ける。
+    枠：表示中=青 / チェック済み=緑 / 未チェック=灰。左上にチェック印（緑）、右上に ⚠ 件数（赤）。
+    """
+    out = thumb.convert("RGB")  # 元画像はキャッシュのものなので必ずコピーに描く
+    draw = ImageDraw.Draw(out)
+    w, h = out.size
+    frame = (30, 90, 230) if current else (20, 150, 60) if checked else (170, 170, 170)
+    bw = max(3, w // 40)
+    draw.rectangle([0, 0, w - 1, h - 1], outline=frame, width=bw)
+
+    font = load_font(max(12, w // 8))
+    pad = bw + 2
+    if checked:
+        # フォントに依存しないよう印は線で描く
+        sz = font.size + 8 if hasattr(font, "size") else 24
+        draw.rectangle([pad, pad, pad + sz, pad + sz], fill=(20, 150, 60))
+        draw.line(
+            [(pad + sz * 0.2, pad + sz * 0.55), (pad + sz * 0.42, pad + sz * 0.78), (pad + sz * 0.8, pad + sz * 0.25)],
+            fill=(255, 255, 255), width=max(2, int(sz) // 7),
+        )
+    if n_flags:
+        txt = str(n_flags)
+        tw, th = _text_wh(draw, txt, font)
+        x1 = w - pad
+        draw.rectangle([x1 - tw - 8, pad, x1, pad + th + 8], fill=(220, 30, 30))
+        draw.text((x1 - tw - 4, pad + 4), txt, fill=(255, 255, 255), font=font)
+    return out
@@ -0,0 +1,140 @@
+"""
+再実行（rerun）ごとの処理時間の計測。
+
+    perf = StageTimer(enabled=True)
+    perf.begin_run()
+    with perf.stage("CSV読込"):
+        ...
+    perf.end_run()
+    perf.summary()   # 区間ごとの直近値・p50・p95（ms）
+
+enabled=False のときは stage() が何もしないコンテキストを返すだけなので、
+計測を切っている本番ではほぼコストがかからない。
+プロファイラ（cProfile / pyinstrument）は Profiler で1回分だけ取る。
+"""
+import cProfile
+import io
+import json
+import pstats
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+_NULL = nullcontext()
+
+class StageTimer:
+    """区間名 → 直近 window 回分の所要時間（秒）を持つ。"""
+
+    def __init__(self, enabled: bool = True, window: int = 200):
+        self.enabled = enabled
+        self.window = window
+        self.samples: dict[str, deque] = {}
+        self.last_run: dict[str, float] = {}
+        self._run_t0 = None
+
+    @contextmanager
+    def _measure(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t0)
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return _NULL
+        return self._measure(name)
+
+    def record(self, name: str, seconds: float):
+        # 同じ再実行で同じ区間を何度も通る場合（サムネイル等）は合計する
+        self.last_run[name] = self.last_run.get(name, 0.0) + seconds
+        if name not in self.samples:
+            self.samples[name] = deque(maxlen=self.window)
+
+    def _flush(self):
+        for name, sec in self.last_run.items():
+            self.samples[name].append(sec)
+
+    def begin_run(self):
+        if not self.enabled:
+            return
+        if self._run_t0 is not None:
+            # 前回が st.stop() / st.rerun() で end_run まで届かなかった分も区間ごとには残す
+            self._flush()
+        self.last_run = {}
+        self._run_t0 = time.perf_counter()
+
+    def end_run(self, total_name: str = "再実行 合計"):
+        """再実行1回分を確定して履歴に積む。"""
+        if not self.enabled or self._run_t0 is None:
+            return
+        self.record(total_name, time.perf_counter() - self._run_t0)
+        self._run_t0 = None
+        self._flush()
+
+    def summary(self) -> list[dict]:
+        import numpy as np  # 計測を有効にしたときだけ使うので起動時には読み込まない
+
+        rows = []
+        for name, dq in self.samples.items():
+            if not dq:
+                continue
+            a = np.fromiter(dq, dtype=float) * 1000
+            rows.append({
+                "区間": name,
+                "回数": len(a),
+                "直近(ms)": round(self.last_run.get(name, 0.0) * 1000, 1),
+                "p50(ms)": round(float(np.percentile(a, 50)), 1),
+                "p95(ms)": round(float(np.percentile(a, 95)), 1),
+            })
+        return sorted(rows, key=lambda r: -r["p50(ms)"])
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "exported_at": datetime.now().isoformat(timespec="seconds"),
+            "summary": self.summary(),
+            "samples_ms": {k: [round(v * 1000, 3) for v in dq] for k, dq in self.samples.items()},
+        }, ensure_ascii=False, indent=2)
+
+    def reset(self):
+        self.samples.clear()
+        self.last_run = {}
+
+class Profiler:
+    """
+    1回分のプロファイル。pyinstrument が入っていればそれを、なければ cProfile を使う。
+    report() はテキストで返す。
+    """
+
+    def __init__(self, prefer: str = "pyinstrument"):
+        self.kind = "cProfile"
+        self._p = None
+        if prefer == "pyinstrument":
+            try:
+                from pyinstrument import Profiler as _Pyinstrument
+                self._p = _Pyinstrument()
+                self.kind = "pyinstrument"
+            except ImportError:
+                pass
+        if self._p is None:
+            self._p = cProfile.Profile()
+
+    def start(self):
+        if self.kind == "pyinstrument":
+            self._p.start()
+        else:
+            self._p.enable()
+
+    def stop(self):
+        if self.kind == "pyinstrument":
+            self._p.stop()
+        else:
+            self._p.disable()
+
+    def report(self, limit: int = 40) -> str:
+        if self.kind == "pyinstrument":
+            return self._p.output_text(unicode=True, color=False)
+        buf = io.StringIO()
+        pstats.Stats(self._p, stream=buf).sort_stats("cumulative").print_stats(limit)
+        return buf.getvalue()
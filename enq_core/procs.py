@@ -0,0 +1,41 @@
+"""
+アプリ（Streamlit サーバ）から作るプロセスプールの起動方法。
+
+Streamlit のサーバはスレッドを多く持つので、そこから fork すると、別のスレッドが握っていたロック
+（logging・キャッシュのロック等）が握られたまま子プロセスに写り、子が止まることがある。
+アプリから作るプールは app_mp_context()（forkserver：スレッドを持たない専用のプロセスから fork する）を使い、
+fork はコマンドラインツール（enq_export_pages.py / enq_prevalidate.py）の中だけで使う。
+
+spawn / forkserver の子プロセスは親の __main__ を復元しようとして、__spec__ のないモジュールなら
+__file__ のスクリプトを __mp_main__ として実行し直す。Streamlit が実行中のアプリ用に作る __main__ は
+__spec__ を持たないので、そのままだと子プロセスでアプリ全体が動いてしまう。起動の直前に __spec__ の
+名前を "__main__" にしておくと、子は __main__ の復元を飛ばす（ワーカーの関数は enq_core にあるので要らない）。
+"""
+import multiprocessing as mp
+import sys
+from importlib.machinery import ModuleSpec
+from multiprocessing.context import ForkServerContext, ForkServerProcess
+
+# forkserver のサーバで先に読み込んでおくモジュール（子プロセスは fork で受け継ぐので起動が速い）。
+# 入っていないものは読み飛ばされる
+_PRELOAD = ["numpy", "pandas", "fitz", "PIL.Image"]
+
+class _AppProcess(ForkServerProcess):
+    def start(self):
+        main = sys.modules.get("__main__")
+        if main is not None and getattr(main, "__spec__", None) is None:
+            main.__spec__ = ModuleSpec("__main__", None)
+        super().start()
+
+class _AppContext(ForkServerContext):
+    Process = _AppProcess
+
+_context = None
+
+def app_mp_context() -> mp.context.BaseContext:
+    """アプリから作る ProcessPoolExecutor の mp_context。"""
+    global _context
+    if _context is None:
+        _context = _AppContext()
+        _context.set_forkserver_preload(_PRELOAD)
+    return _context
@@ -0,0 +1,405 @@
+"""
+PDFページのラスタライズと先読み（プリフェッチ）。
+
+Streamlit の再実行とは独立して動かすため、UI スクリプトから切り離したモジュール。
+先読みワーカー（別プロセス）はこのモジュールだけを import して動くので、
+ここでは streamlit を import しないこと。
+
+export_pages() / PageStore はページ画像をディスクに書き出して使い回すためのもの
+（書き出しは enq_export_pages.py から行う）。
+"""
+import json
+import multiprocessing as mp
+import os
+import threading
+from io import BytesIO
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from .procs import app_mp_context
+
+# =========================
+# Render
+# =========================
+
+def render_page_samples(doc, page_index: int, dpi: int) -> tuple[int, int, bytes]:
+    """ページを RGB でラスタライズし、(幅, 高さ, 生バイト列) を返す。"""
+    page = doc.load_page(page_index)
+    zoom = dpi / 72
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+    return pix.width, pix.height, pix.samples
+
+def render_clip_samples(doc, page_index: int, bbox, dpi: int) -> tuple[int, int, bytes]:
+    """
+    正規化 bbox（0..1, template.json と同じ形式）の範囲だけをラスタライズする。
+    ページ全体を描くより軽いので、設問ごとのスニペットを高DPIで出すのに使う。
+    """
+    page = doc.load_page(page_index)
+    r = page.rect
+    x0, y0, x1, y1 = [max(0.0, min(1.0, float(v))) for v in bbox]
+    clip = fitz.Rect(
+        r.x0 + x0 * r.width, r.y0 + y0 * r.height,
+        r.x0 + x1 * r.width, r.y0 + y1 * r.height,
+    ).normalize()
+    if clip.is_empty:
+        raise ValueError(f"empty bbox: {bbox}")
+    zoom = dpi / 72
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, alpha=False)
+    return pix.width, pix.height, pix.samples
+
+def samples_to_image(entry: tuple[int, int, bytes]) -> Image.Image:
+    w, h, samples = entry
+    return Image.frombytes("RGB", (w, h), samples)
+
+def render_page(doc, page_index: int, dpi: int) -> Image.Image:
+    return samples_to_image(render_page_samples(doc, page_index, dpi))
+
+# キャッシュに置く形式："raw"（生RGB・最速）/ "png" / "webp"（可逆・省メモリ）
+ENTRY_FORMATS = ("raw", "png", "webp")
+
+def encode_entry(w: int, h: int, samples: bytes, fmt: str = "raw") -> tuple[int, int, str, bytes]:
+    """レンダリング結果をキャッシュ格納用の (幅, 高さ, 形式, データ) にする。"""
+    if fmt == "raw":
+        return w, h, fmt, bytes(samples)
+    img = Image.frombytes("RGB", (w, h), samples)
+    buf = BytesIO()
+    if fmt == "png":
+        img.save(buf, format="PNG", compress_level=1)
+    elif fmt == "webp":
+        img.save(buf, format="WEBP", lossless=True, method=0)
+    else:
+        raise ValueError(f"unknown cache format: {fmt}")
+    return w, h, fmt, buf.getvalue()
+
+def decode_entry(entry: tuple[int, int, str, bytes]) -> Image.Image:
+    w, h, fmt, data = entry
+    if fmt == "raw":
+        return Image.frombytes("RGB", (w, h), data)
+    return Image.open(BytesIO(data)).convert("RGB")
+
+def render_page_entry(doc, page_index: int, dpi: int, fmt: str = "raw"):
+    return encode_entry(*render_page_samples(doc, page_index, dpi), fmt=fmt)
+
+# =========================
+# Worker（別プロセス側）
+# =========================
+# PyMuPDF はスレッド非対応なので、ワーカーはプロセスごとに自前の Document を開く。
+_worker_doc = None
+
+def _worker_init(pdf_src):
+    """pdf_src はバイト列またはファイルパス。"""
+    global _worker_doc
+    if isinstance(pdf_src, (str, os.PathLike)):
+        _worker_doc = fitz.open(pdf_src)
+    else:
+        _worker_doc = fitz.open(stream=pdf_src, filetype="pdf")
+
+def _worker_render(page_index: int, dpi: int, fmt: str):
+    # 圧縮もワーカー側で済ませ、UI 側はデコードだけにする
+    return render_page_entry(_worker_doc, page_index, dpi, fmt)
+
+def _worker_export(page_index: int, dpi: int, fmt: str, path: str):
+    w, h, _, data = render_page_entry(_worker_doc, page_index, dpi, fmt)
+    _write_atomic(Path(path), data)
+    return page_index, w, h
+
+# =========================
+# Store（ディスク上のページ画像）
+# =========================
+
+STORE_FORMATS = ("png", "webp")
+
+def _write_atomic(path: Path, data: bytes):
+    # 書きかけのファイルをレビュアーが読まないよう、一時ファイル経由で置き換える
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+class PageStore:
+    """
+    export_pages() が書き出したページ画像を読む。
+    配置: <root>/<pdf_key>/<dpi>/<page_index:05d>.<fmt> と、同じ場所の manifest.json
+    （{"fmt": ..., "pages": {"page_index": [幅, 高さ]}}）。
+    """
+
+    def __init__(self, root, pdf_key: str):
+        self.dir = Path(root) / pdf_key
+        self._manifests = {}  # dpi -> (mtime_ns, manifest)
+        self._lock = threading.Lock()
+
+    def _dpi_dir(self, dpi: int) -> Path:
+        return self.dir / str(int(dpi))
+
+    def manifest(self, dpi: int) -> dict:
+        """manifest.json を読む（書き出しが進んで更新されていたら読み直す）。"""
+        path = self._dpi_dir(dpi) / "manifest.json"
+        try:
+            mtime = path.stat().st_mtime_ns
+        except OSError:
+            return {"fmt": "", "pages": {}}
+        with self._lock:
+            cached = self._manifests.get(int(dpi))
+            if cached and cached[0] == mtime:
+                return cached[1]
+        try:
+            m = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {"fmt": "", "pages": {}}
+        with self._lock:
+            self._manifests[int(dpi)] = (mtime, m)
+        return m
+
+    def page_path(self, page_index: int, dpi: int, fmt: str) -> Path:
+        return self._dpi_dir(dpi) / f"{int(page_index):05d}.{fmt}"
+
+    def __contains__(self, key) -> bool:
+        page_index, dpi = key
+        return str(int(page_index)) in self.manifest(dpi)["pages"]
+
+    def count(self, dpi: int) -> int:
+        return len(self.manifest(dpi)["pages"])
+
+    def get(self, page_index: int, dpi: int):
+        """書き出し済みなら encode_entry() と同じ形で返す。なければ None。"""
+        m = self.manifest(dpi)
+        size = m["pages"].get(str(int(page_index)))
+        if size is None:
+            return None
+        try:
+            data = self.page_path(page_index, dpi, m["fmt"]).read_bytes()
+        except OSError:
+            return None
+        return size[0], size[1], m["fmt"], data
+
+def export_pages(pdf_path, pdf_key: str, root, page_indices, dpi: int, fmt: str = "webp",
+                 workers: int = 2, progress=None) -> dict:
+    """
+    page_indices をプロセスプールでラスタライズして root 配下に書き出す。
+    各ワーカーは自分で PDF を開く。書き出し済みのページは飛ばすので、中断しても続きから再開できる。
+    progress(done, total) を渡すと1枚ごとに呼ぶ。manifest は最後にまとめて更新し、その内容を返す。
+    """
+    if fmt not in STORE_FORMATS:
+        raise ValueError(f"unknown store format: {fmt}")
+    store = PageStore(root, pdf_key)
+    out_dir = store._dpi_dir(dpi)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = store.manifest(dpi)
+    if manifest["fmt"] != fmt:
+        manifest = {"fmt": fmt, "pages": {}}  # 形式を変えたら作り直す
+    todo = sorted({int(i) for i in page_indices} - {int(k) for k in manifest["pages"]})
+
+    def _save():
+        _write_atomic(out_dir / "manifest.json", json.dumps(manifest).encode("utf-8"))
+
+    # コマンドラインツール（enq_export_pages.py）から呼ぶもので、スレッドはないので fork でよい
+    with ProcessPoolExecutor(
+        max_workers=max(1, int(workers)),
+        mp_context=mp.get_context("fork"),
+        initializer=_worker_init,
+        initargs=(str(pdf_path),),
+    ) as ex:
+        futs = [ex.submit(_worker_export, i, int(dpi), fmt, str(store.page_path(i, dpi, fmt))) for i in todo]
+        for n, fut in enumerate(futs, 1):
+            page_index, w, h = fut.result()
+            manifest["pages"][str(page_index)] = [w, h]
+            if n % 200 == 0:
+                _save()  # 途中経過もレビュアーから見えるようにする
+            if progress:
+                progress(n, len(todo))
+    _save()
+    return manifest
+
+# =========================
+# Cache
+# =========================
+
+class PageCache:
+    """
+    (pdf_key, page_index, dpi) → encode_entry() の結果、を保持する LRU キャッシュ。
+    件数ではなくデータのバイト数で上限をかけ、超えたら古いものから捨てる。
+    ヒット・ミスは kind ごとに数える：ページ画像（page → hits / misses）、フィルムストリップのサムネイル
+    （thumb → thumb_hits / thumb_misses）、設問スニペット（clip → clip_hits / clip_misses）。
+    サムネイルは低DPIでほぼ必ず当たるので、混ぜるとページ画像のヒット率が読めなくなる。
+    """
+
+    _COUNTERS = {
+        "page": ("hits", "misses"),
+        "thumb": ("thumb_hits", "thumb_misses"),
+        "clip": ("clip_hits", "clip_misses"),
+    }
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024, fmt: str = "raw"):
+        if fmt not in ENTRY_FORMATS:
+            raise ValueError(f"unknown cache format: {fmt}")
+        self.max_bytes = max(0, int(max_bytes))
+        self.fmt = fmt
+        self._items: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.thumb_hits = 0
+        self.thumb_misses = 0
+        self.clip_hits = 0
+        self.clip_misses = 0
+        self.evictions = 0
+
+    def get(self, key, kind: str = "page"):
+        hit_attr, miss_attr = self._COUNTERS[kind]
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                setattr(self, miss_attr, getattr(self, miss_attr) + 1)
+                return None
+            self._items.move_to_end(key)
+            setattr(self, hit_attr, getattr(self, hit_attr) + 1)
+            return entry
+
+    def put(self, key, entry):
+        size = len(entry[3])
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.nbytes -= len(old[3])
+            if size > self.max_bytes:
+                return  # 1枚で予算超過するものは置かない
+            self._items[key] = entry
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, ev = self._items.popitem(last=False)
+                self.nbytes -= len(ev[3])
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+            # 消す前の実行の分が混ざるとヒット率が読めなくなるので、数えるのもやり直す
+            self.hits = self.misses = 0
+            self.thumb_hits = self.thumb_misses = 0
+            self.clip_hits = self.clip_misses = 0
+            self.evictions = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._items),
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "format": self.fmt,
+                "hits": self.hits,
+                "misses": self.misses,
+                "thumb_hits": self.thumb_hits,
+                "thumb_misses": self.thumb_misses,
+                "clip_hits": self.clip_hits,
+                "clip_misses": self.clip_misses,
+                "evictions": self.evictions,
+            }
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            return key in self._items
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+# =========================
+# Prefetch
+# =========================
+
+class PagePrefetcher:
+    """
+    1つのPDFについて、次に見そうなページをプロセスプールで先にレンダリングし、
+    結果を PageCache に入れておく。表示側は get_image() で取り出す。
+    pdf_src はファイルパス（推奨：ワーカーがPDF全体のコピーを持たない）またはバイト列。
+    """
+
+    def __init__(self, pdf_key: str, pdf_src, cache: PageCache, workers: int = 2,
+                 store: PageStore | None = None):
+        self.pdf_key = pdf_key
+        self.cache = cache
+        self.store = store
+        self._inflight = {}  # key -> Future
+        self._closed = False
+        # add_done_callback は完了済みだと即座に _done を呼ぶので再入可能なロックにする
+        self._lock = threading.RLock()
+        # アプリ（スレッドの多い Streamlit サーバ）から作るので fork せず forkserver で起動する（enq_core.procs）
+        self._pool = ProcessPoolExecutor(
+            max_workers=max(1, int(workers)),
+            mp_context=app_mp_context(),
+            initializer=_worker_init,
+            initargs=(str(pdf_src) if isinstance(pdf_src, os.PathLike) else pdf_src,),
+        )
+
+    def _key(self, page_index: int, dpi: int):
+        return (self.pdf_key, int(page_index), int(dpi))
+
+    def _done(self, key, fut):
+        with self._lock:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+        if fut.cancelled() or fut.exception() is not None:
+            return
+        self.cache.put(key, fut.result())
+
+    def prefetch(self, page_indices, dpi: int):
+        """page_indices を先読み予約する。新しい予約に含まれない未着手の予約は取り消す。"""
+        wanted = [self._key(pi, dpi) for pi in page_indices]
+        wanted_set = set(wanted)
+        with self._lock:
+            if self._closed:
+                return  # shutdown 後（キャッシュから外れた後も、使用中のセッションが呼ぶことがある）は先読みしない
+            # 連打で古い予約が溜まらないよう、まだ始まっていないものは捨てる
+            for key, fut in list(self._inflight.items()):
+                if key not in wanted_set and fut.cancel():
+                    self._inflight.pop(key, None)
+            for key in wanted:
+                if key in self._inflight or key in self.cache:
+                    continue
+                if self.store is not None and key[1:] in self.store:
+                    continue
+                fut = self._pool.submit(_worker_render, key[1], key[2], self.cache.fmt)
+                self._inflight[key] = fut
+                fut.add_done_callback(partial(self._done, key))
+
+    def get_image(self, doc, page_index: int, dpi: int, thumb: bool = False) -> Image.Image:
+        """キャッシュ → 書き出し済み画像 → 先読み中の結果 → その場でレンダリング、の順に取得する。
+        thumb=True（フィルムストリップ）はキャッシュのヒット・ミスをページ画像とは別に数える。"""
+        key = self._key(page_index, dpi)
+        entry = self.cache.get(key, kind="thumb" if thumb else "page")
+        if entry is None and self.store is not None:
+            entry = self.store.get(page_index, dpi)
+            if entry is not None:
+                self.cache.put(key, entry)
+        if entry is None:
+            with self._lock:
+                fut = self._inflight.get(key)
+            if fut is not None and not fut.cancelled():
+                try:
+                    entry = fut.result()
+                except Exception:
+                    entry = None
+        if entry is None:
+            entry = render_page_entry(doc, page_index, dpi, self.cache.fmt)
+            self.cache.put(key, entry)
+        return decode_entry(entry)
+
+    def get_clip_image(self, doc, page_index: int, bbox, dpi: int) -> Image.Image:
+        """設問スニペット（bbox の切り抜き）。ページ画像と同じキャッシュに入れる。"""
+        key = self._key(page_index, dpi) + (tuple(float(v) for v in bbox),)
+        entry = self.cache.get(key, kind="clip")
+        if entry is None:
+            entry = encode_entry(*render_clip_samples(doc, page_index, bbox, dpi), fmt=self.cache.fmt)
+            self.cache.put(key, entry)
+        return decode_entry(entry)
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,143 @@
+"""
+ページレビューのデータ側の処理（UI に依存しない部分）。
+
+- build_page_map / RespondentIndex : 論理ページ・回答者番号の対応
+- build_global_queue / page_flag_counts : FlagTable からの修正キュー・ページ別件数
+- journal : 反映の追記ログ（JSONL）の書き込み・読み込み・再生
+- df_digest : 編集データの内容ハッシュ
+"""
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .validate import REASON_LABELS, REASON_OK, FlagTable
+
+ID_COL = "回答者番号"
+
+def build_page_map(template: dict) -> dict:
+    pages = template.get("pages", {})
+    return {pno: list(qmap.keys()) for pno, qmap in pages.items()}
+
+class RespondentIndex:
+    """
+    回答者番号 → 行位置・行ラベル・PDF先頭ページの対応。
+    読み込んだCSVごとに1回だけ作り、移動・キュー・オーバーレイで使い回す。
+    （回答者番号が重複している場合は従来どおり最初の行を使う）
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.ids = df[ID_COL].astype(str).tolist()
+        self.labels = df.index
+        self._pos = {}
+        for i, rid in enumerate(self.ids):
+            self._pos.setdefault(rid, i)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, rid) -> bool:
+        return rid in self._pos
+
+    def position(self, rid) -> int:
+        return self._pos[str(rid)]
+
+    def label(self, rid):
+        return self.labels[self._pos[str(rid)]]
+
+    def pdf_start(self, rid, pages_per_resp: int) -> int:
+        return self._pos[str(rid)] * int(pages_per_resp)
+
+def _cell_values(df: pd.DataFrame, rows: np.ndarray, cols: pd.Series) -> np.ndarray:
+    """(rows[i], cols[i]) のセルの値。⚠ のある列だけを取り出す（表全体を to_numpy() でコピーしない）。"""
+    col_pos = {c: j for j, c in enumerate(df.columns)}
+    out = np.empty(len(rows), dtype=object)
+    for col, idx in cols.groupby(cols, sort=False).indices.items():
+        out[idx] = df.iloc[:, col_pos[col]].to_numpy()[rows[idx]]
+    return out
+
+def build_global_queue(
+    flag_table: FlagTable, resp_index: RespondentIndex, df: pd.DataFrame, qid_to_page: dict, checked: dict
+) -> pd.DataFrame:
+    """全回答者の ⚠ セル（チェック済みページ由来は除く）を1つの表にする。"""
+    fc = flag_table.flagged_cells()
+    resp_ids = np.array(resp_index.ids, dtype=object)
+    q = pd.DataFrame({
+        ID_COL: resp_ids[fc["row"].to_numpy()],
+        "ページ": fc["設問ID"].map(qid_to_page).astype("Int64"),
+        "設問ID": fc["設問ID"],
+        "現在値": _cell_values(df, fc["row"].to_numpy(), fc["設問ID"]),
+        "理由区分": fc["code"].map(REASON_LABELS),
+        "理由": fc["理由"],
+        "row": fc["row"],
+    })
+    pairs = {(str(r), int(p)) for r, pages in checked.items() for p in pages}
+    if pairs and len(q):
+        done = pd.MultiIndex.from_arrays([q[ID_COL], q["ページ"].fillna(-1).astype(int)]).isin(pairs)
+        q = q[~done]
+    return q
+
+def page_flag_counts(flag_table: FlagTable, page_map: dict, row_pos: int) -> dict:
+    """論理ページ → その回答者の ⚠ 件数（編集表と同じく page_map の設問で数える）。"""
+    row = flag_table.codes[row_pos] != REASON_OK
+    col_pos = flag_table.col_pos
+    return {
+        int(p): int(sum(row[col_pos[q]] for q in qids if q in col_pos))
+        for p, qids in page_map.items()
+    }
+
+def df_digest(df: pd.DataFrame) -> str:
+    """データ内容のハッシュ（列名＋全セル）。同じ内容のチェックポイントを重複して書かないために使う。"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps([str(c) for c in df.columns], ensure_ascii=False).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+# =========================
+# Journal（反映の追記ログ）
+# =========================
+# 反映のたびに全件CSVを書き直す代わりに、変わったセルだけを JSONL に追記する。
+# 自動保存CSV（スナップショット）＋ journal の再生 ＝ 最新の状態。
+
+def journal_path_for(autosave_path: str) -> Path:
+    p = Path(autosave_path)
+    return p.with_name(f"{p.stem}.journal.jsonl")
+
+def append_journal(autosave_path: str, records: list[dict]):
+    if not records:
+        return
+    with journal_path_for(autosave_path).open("a", encoding="utf-8") as f:
+        for rec in records:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+def read_journal(autosave_path: str) -> list[dict]:
+    jp = journal_path_for(autosave_path)
+    if not jp.exists():
+        return []
+    records = []
+    for line in jp.read_text(encoding="utf-8").splitlines():
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            break  # 書きかけの最終行は捨てる
+    return records
+
+def replay_journal(df: pd.DataFrame, records: list[dict], checked: dict | None = None) -> tuple[pd.DataFrame, dict]:
+    """スナップショットに journal を順に当てる。checked にもページのチェックを足す。"""
+    checked = {k: list(v) for k, v in (checked or {}).items()}
+    pos = {}
+    for i, rid in enumerate(df[ID_COL].astype(str)):
+        pos.setdefault(rid, i)
+    for rec in records:
+        resp = str(rec.get("resp", ""))
+        if rec.get("op") == "cell":
+            if resp in pos and rec.get("qid") in df.columns:
+                df.iat[pos[resp], df.columns.get_loc(rec["qid"])] = rec.get("new", "")
+        elif rec.get("op") == "checked":
+            pages = checked.setdefault(resp, [])
+            if int(rec["page"]) not in pages:
+                pages.append(int(rec["page"]))
+                pages.sort()
+    return df, checked
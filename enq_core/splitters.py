@@ -0,0 +1,477 @@
+"""
+アンケートCSVの分割処理（survey_data_splitter*.py の中身）。
+
+- split_number_text   : 「数値:テキスト」「数値;テキスト」のセルを数値部分とテキスト列に分ける
+- split_multi_answers : 「;」区切りの複数回答を 列名_1, 列名_2, ... に展開する
+- dummy_multi_answers : 「;」区切りの複数回答を選択肢ごとの 0/1 列（列名_選択肢、UInt8 / 疎、無回答は欠損）に展開する
+いずれも (処理後の DataFrame, 分割したセルの記録 list[dict]) を返し、入力の df は変更しない。
+
+列の多いCSVは workers > 1 で列のまとまりごとにプロセスを分けて処理する（列ごとに独立なので結果は同じ）。
+チャンク処理では1つのプロセスプールを全チャンクで使い回す（チャンクごとに fork しない）。
+
+大きなCSVは stream_split_number_text / stream_split_multi_answers / stream_dummy_multi_answers で
+チャンクごとに処理する。先に読み込んで出力の列構成（テキスト列を作る列・最大分割数・選択肢）を決め、次にチャンクを分割して
+そのままファイルに書くので、メモリに載るのは常に1チャンク分だけ。
+出力は CSV のほか Parquet / Feather でも書ける（enq_core.tableio）。
+"""
+import os
+import re
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .encoding import detect_encoding
+from .procs import app_mp_context
+from .tableio import TABLE_SUFFIXES, TableWriter
+
+# チャンク処理の既定の行数と、アプリが自動でチャンク処理に切り替えるファイルサイズ
+CHUNK_ROWS = 50_000
+STREAM_THRESHOLD_MB = 100
+
+# チャンク処理の出力（処理済みCSV・分割情報CSV）の置き場。KEEP_HOURS より古いものは次の処理で消す
+STREAM_OUT_DIR = Path(os.environ.get("ENQ_SPLIT_OUT_DIR", Path(tempfile.gettempdir()) / "enq_split_out"))
+STREAM_OUT_KEEP_HOURS = 24
+
+# 列の並列処理：既定のプロセス数、並列にする最少の列数、1プロセスに渡す列のまとまりの最少の列数。
+# 既定のプロセス数は同時に処理するセッションの数だけ掛け算になるので、CPU数によらず SPLIT_WORKERS_MAX までにする
+SPLIT_WORKERS_MAX = 4
+SPLIT_WORKERS = int(os.environ.get("ENQ_SPLIT_WORKERS", min(SPLIT_WORKERS_MAX, os.cpu_count() or 1)))
+PARALLEL_MIN_COLS = 200
+COLUMN_BATCH_MIN = 32
+
+# ダミー列に展開する列の選択肢の上限（これを超える列は自由記述とみなして展開しない）
+DUMMY_MAX_OPTIONS = 100
+
+# 数値・真偽値を str() にしたときに現れうる文字。区切りがこれを含まなければ、その列は文字列にせずに飛ばせる
+_NUMERIC_STR_CHARS = frozenset("0123456789.+-eEinfaINFTrueFals()j ")
+
+def _may_contain(s: pd.Series, sep: str) -> bool:
+    if pd.api.types.is_numeric_dtype(s) or pd.api.types.is_bool_dtype(s):
+        return any(ch in _NUMERIC_STR_CHARS for ch in sep)
+    return True
+
+def read_csv_auto(raw: bytes) -> tuple[pd.DataFrame, str, float]:
+    """文字コードを自動判定して読み込む。(df, 判定した文字コード, 信頼度) を返す。"""
+    encoding, confidence = detect_encoding(raw)
+    df = pd.read_csv(BytesIO(raw), encoding=encoding)
+    return df, encoding, confidence
+
+def _number_text_pattern(sep: str) -> re.Pattern:
+    # 最初の sep の左が「数値・コンマ・空白」だけのセルに当たる。左は後で strip して空なら外す。
+    # 最短一致なので、区切りが数値側の文字（"," など）でも最初の sep で分けた場合と同じになる
+    return re.compile(rf'^([\d,\s]*?){re.escape(sep)}(.*)$', re.S)
+
+def _number_text_hits(s: pd.Series, sep: str, pattern: re.Pattern):
+    """分割するセルの (元の値, 数値部分, テキスト部分)。index は行位置。なければ None。"""
+    if not _may_contain(s, sep):
+        return None
+    values = s[s.notna()].astype(str)
+    values = values[values.str.contains(sep, regex=False)]
+    parts = values.str.extract(pattern)
+    left = parts[0].str.strip()
+    hit = left.notna() & (left != '')
+    if not hit.any():
+        return None
+    return values[hit], left[hit], parts[1][hit].str.strip()
+
+def _clip(values: pd.Series, n: int) -> pd.Series:
+    """split_info 表示用：n 文字を超える値は先頭 n 文字＋'...' にする。"""
+    return values.where(values.str.len() <= n, values.str[:n] + '...')
+
+def _assemble(df: pd.DataFrame, pieces: list) -> pd.DataFrame:
+    if not pieces:
+        return df.copy()
+    df_processed = pd.concat(pieces, axis=1)
+    df_processed.index = df.index
+    return df_processed
+
+# =========================
+# 列の並列処理
+# =========================
+
+def _worker_split(args):
+    split, batch, kwargs = args
+    processed, info = split(batch, **kwargs)
+    return processed.reset_index(drop=True), info
+
+def _column_batches(n_cols: int, workers: int) -> list[tuple[int, int]]:
+    # プロセス数の4倍程度に分けて、分割の多い列が偏ってもプロセスが遊ばないようにする
+    size = max(COLUMN_BATCH_MIN, -(-n_cols // (workers * 4)))
+    return [(a, min(a + size, n_cols)) for a in range(0, n_cols, size)]
+
+def _new_pool(workers: int) -> ProcessPoolExecutor:
+    # アプリ（スレッドの多い Streamlit サーバ）から呼ばれるので fork せず forkserver で起動する（enq_core.procs）。
+    # ワーカーは列のまとまりを引数で受け取るだけなので、親から受け継ぐ状態は要らない
+    return ProcessPoolExecutor(max_workers=workers, mp_context=app_mp_context())
+
+@contextmanager
+def split_pool(workers: int):
+    """
+    workers > 1 ならプロセスプール、そうでなければ None を返す。チャンク処理で全チャンクに使い回す
+    （プロセスは最初に並列処理が要るチャンクで起動するので、列の少ないCSVでは fork しない）。
+    """
+    if workers <= 1:
+        yield None
+        return
+    pool = _new_pool(workers)
+    try:
+        yield pool
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+def _split_parallel(
+    split, df: pd.DataFrame, workers: int, pool: ProcessPoolExecutor | None = None, **kwargs
+) -> tuple[pd.DataFrame, list[dict]]:
+    """
+    連続した列のまとまりごとに split をプロセスプールで実行し、まとまりの順につなぐ。
+    追加列は元の列の右隣にしか入らないので、つなげば1プロセスで処理したときと同じ列順・split_info の順になる。
+    列のまとまりと戻りの DataFrame は pickle で受け渡す（文字列列は Arrow のバッファのまま送られる）。
+    pool を渡さなければ、この呼び出しの間だけプールを作る。
+    """
+    batches = _column_batches(df.shape[1], workers)
+    tasks = [(split, df.iloc[:, a:b], kwargs) for a, b in batches]
+    if pool is None:
+        with _new_pool(min(workers, len(batches))) as ex:
+            results = list(ex.map(_worker_split, tasks))
+    else:
+        results = list(pool.map(_worker_split, tasks))
+    split_info = [rec for _, info in results for rec in info]
+    return _assemble(df, [processed for processed, _ in results]), split_info
+
+def _use_parallel(df: pd.DataFrame, workers: int) -> bool:
+    return workers > 1 and df.shape[1] >= PARALLEL_MIN_COLS
+
+# =========================
+# 分割
+# =========================
+
+def split_number_text(
+    df: pd.DataFrame, sep: str = ":", text_cols=None, row_offset: int = 0, workers: int = 1,
+    pool: ProcessPoolExecutor | None = None,
+) -> tuple[pd.DataFrame, list[dict]]:
+    """
+    sep を含み、左側が数値またはコンマ区切りの数値（例: "14", "6,12"）のセルを分割する。
+    左側は元の列に残し、右側は「列名_テキスト」列として元の列の右隣に挿入する。
+    ":" と ";" のどちらも同じ処理で、列ごとに正規表現1つの str.extract でまとめて判定・分割する。
+    text_cols を渡すとその列には（このチャンクで分割がなくても）テキスト列を作る。
+    row_offset は split_info の「行」に足す値（チャンクの先頭の行位置）。
+    workers > 1 で列が PARALLEL_MIN_COLS 以上なら、列のまとまりごとに workers プロセスで並列に処理する。
+    pool（split_pool() の戻り値）を渡すとそのプールを使う。
+    """
+    if _use_parallel(df, workers):
+        return _split_parallel(
+            split_number_text, df, workers, pool, sep=sep, text_cols=text_cols, row_offset=row_offset,
+        )
+    pattern = _number_text_pattern(sep)
+    split_info = []
+    pieces = []  # 出力の列（元の列・テキスト列）を順番に
+    work = df.reset_index(drop=True)  # 行は位置で揃える（index の重複に影響されない）
+
+    for j, col in enumerate(work.columns):
+        s = work.iloc[:, j]
+        hits = _number_text_hits(s, sep, pattern)
+        if hits is None:
+            pieces.append(s)
+            if text_cols is not None and col in text_cols:
+                pieces.append(pd.Series(None, index=s.index, dtype=object, name=f"{col}_テキスト"))
+            continue
+
+        values, left, right = hits
+        pieces.append(s.mask(s.index.isin(left.index), left))
+        pieces.append(right.reindex(s.index).rename(f"{col}_テキスト"))
+
+        rows = values.index.to_numpy() + 2 + row_offset  # index は行位置（ヘッダー行を考慮して+2）
+        split_info.extend(
+            {'行': r, '列': col, '元の値': v, '数値部分': n, 'テキスト部分': t}
+            for r, v, n, t in zip(rows.tolist(), _clip(values, 50).tolist(), left.tolist(), _clip(right, 50).tolist())
+        )
+
+    return _assemble(df, pieces), split_info
+
+def _count_parts(s: pd.Series, sep: str):
+    """(文字列にした値, sep を含むか) 。sep を含むセルがなければ None。"""
+    if not _may_contain(s, sep):
+        return None
+    values = s[s.notna()].astype(str)
+    has_sep = values.str.contains(sep, regex=False)
+    if not has_sep.any():
+        return None
+    return values, has_sep
+
+def _multi_answer_info(split_values: pd.Series, col, sep: str, row_offset: int):
+    """split_info の記録（sep を含むセルごとに 行・列・元の値・分割数）。"""
+    rows = split_values.index.to_numpy() + 2 + row_offset  # index は行位置（ヘッダー行を考慮して+2）
+    counts = split_values.str.count(re.escape(sep)) + 1
+    # DataFrame.to_dict より、Python のリストから直接 dict を作るほうがずっと速い
+    return (
+        {'行': r, '列': col, '元の値': v, '分割数': k}
+        for r, v, k in zip(rows.tolist(), _clip(split_values, 80).tolist(), counts.tolist())
+    )
+
+def split_multi_answers(
+    df: pd.DataFrame, sep: str = ";", max_parts: dict | None = None, row_offset: int = 0, workers: int = 1,
+    pool: ProcessPoolExecutor | None = None,
+) -> tuple[pd.DataFrame, list[dict]]:
+    """
+    sep を含むセルがある列を、最大分割数ぶんの「列名_1, 列名_2, ...」に展開して元の列の右隣に挿入する。
+    sep を含まない値はそのまま 列名_1 に入る。元の列は残す。
+    列ごとに Series.str でまとめて分割し、出力は最後に1回の concat で元の列順どおりに組み立てる。
+    max_parts（列 → 分割数）を渡すと、その列をこのチャンクの内容によらずその数の列に展開する。
+    row_offset は split_info の「行」に足す値（チャンクの先頭の行位置）。
+    workers > 1 で列が PARALLEL_MIN_COLS 以上なら、列のまとまりごとに workers プロセスで並列に処理する。
+    pool（split_pool() の戻り値）を渡すとそのプールを使う。
+    """
+    if _use_parallel(df, workers):
+        return _split_parallel(
+            split_multi_answers, df, workers, pool, sep=sep, max_parts=max_parts, row_offset=row_offset,
+        )
+    split_info = []
+    pieces = []  # 出力の列（元の列・追加列）を順番に
+    work = df.reset_index(drop=True)  # 行は位置で揃える（index の重複に影響されない）
+
+    for j, col in enumerate(work.columns):
+        s = work.iloc[:, j]
+        pieces.append(s)
+        n_parts = None if max_parts is None else max_parts.get(col, 0)
+        counted = _count_parts(s, sep) if n_parts != 0 else None
+        if counted is None and not n_parts:
+            continue  # この列には区切りなし
+
+        # 追加列（例: Q1_1, Q1_2, ...）。分割するのは区切りを含む行だけで、
+        # 区切りのない値はそのまま 列名_1 に入れる。欠損の行はすべて空
+        if counted is None:
+            values = s[s.notna()].astype(str)
+            has_sep = pd.Series(False, index=values.index)
+        else:
+            values, has_sep = counted
+        split_values = values[has_sep]
+        if len(split_values):
+            parts = split_values.str.split(sep, regex=False, expand=True)
+            parts = parts.apply(lambda c: c.str.strip()).reindex(s.index)
+        else:
+            parts = pd.DataFrame({0: pd.Series(None, index=s.index, dtype=object)})
+        parts[0] = parts[0].fillna(values[~has_sep].str.strip())
+        if n_parts:
+            parts = parts.reindex(columns=range(n_parts))
+        parts.columns = [f"{col}_{i+1}" for i in range(parts.shape[1])]
+        pieces.append(parts)
+
+        split_info.extend(_multi_answer_info(split_values, col, sep, row_offset))
+
+    return _assemble(df, pieces), split_info
+
+def _dummies(values: pd.Series, sep: str) -> pd.DataFrame:
+    """選択肢ごとの 0/1（uint8）。選択肢は前後の空白を落とした値で、列は文字列順。"""
+    # get_dummies は選択肢の前後の空白を落とさないので、区切りの前後の空白を先に消しておく
+    tokens = values.str.strip().str.replace(rf"\s*{re.escape(sep)}\s*", sep, regex=True)
+    dummies = tokens.str.get_dummies(sep, dtype=np.uint8)
+    return dummies.drop(columns="", errors="ignore")  # 「1;;2」「4;」の空の選択肢は数えない
+
+def dummy_multi_answers(
+    df: pd.DataFrame, sep: str = ";", options: dict | None = None, sparse: bool = False,
+    max_options: int | None = DUMMY_MAX_OPTIONS, row_offset: int = 0, workers: int = 1,
+    pool: ProcessPoolExecutor | None = None,
+) -> tuple[pd.DataFrame, list[dict]]:
+    """
+    split_multi_answers のダミー列版。sep を含むセルがある列を、選択肢ごとの 0/1 列
+    「列名_選択肢」（UInt8）に展開して元の列の右隣に挿入する。元の列は残す。
+    元の値が欠損（無回答）の行は 0（選ばなかった）と区別できるよう、ダミー列も欠損（<NA>）にする。
+    sparse=True なら 0/1 列を SparseDtype(float32, 0) にする（欠損を NaN で持てる疎な型。
+    選ばれることの少ない選択肢が多いと小さくなる）。
+    選択肢が max_options を超える列（自由記述にたまたま sep が入っている等）は展開しない。
+    options（列 → 選択肢のリスト）を渡すと、その列をこのチャンクの内容によらずその選択肢の列に展開する。
+    作った列名が既存の列や別の列のダミー列と重なるときは ValueError（黙って上書き・重複させない）。
+    split_info・row_offset・workers・pool は split_multi_answers と同じ。
+    """
+    if _use_parallel(df, workers):
+        processed, split_info = _split_parallel(
+            dummy_multi_answers, df, workers, pool, sep=sep, options=options, sparse=sparse,
+            max_options=max_options, row_offset=row_offset,
+        )
+        _check_dummy_names(df, processed)  # 列のまとまりをまたいだ重なりはここで見る
+        return processed, split_info
+    split_info = []
+    pieces = []  # 出力の列（元の列・ダミー列）を順番に
+    work = df.reset_index(drop=True)  # 行は位置で揃える（index の重複に影響されない）
+    dummy_dtype = pd.SparseDtype(np.float32, 0) if sparse else pd.UInt8Dtype()
+
+    for j, col in enumerate(work.columns):
+        s = work.iloc[:, j]
+        pieces.append(s)
+        if options is None:
+            counted = _count_parts(s, sep)
+            if counted is None:
+                continue  # この列には区切りなし
+            values, has_sep = counted
+        elif col in options:
+            values = s[s.notna()].astype(str)
+            has_sep = values.str.contains(sep, regex=False)
+        else:
+            continue
+
+        dummies = _dummies(values, sep)
+        if options is not None:
+            dummies = dummies.reindex(columns=options[col], fill_value=0)
+        elif max_options is not None and dummies.shape[1] > max_options:
+            continue
+        dummies = dummies.reindex(s.index).astype(dummy_dtype)  # 欠損の行は欠損のまま
+        dummies.columns = [f"{col}_{opt}" for opt in dummies.columns]
+        pieces.append(dummies)
+        split_info.extend(_multi_answer_info(values[has_sep], col, sep, row_offset))
+
+    processed = _assemble(df, pieces)
+    _check_dummy_names(df, processed)
+    return processed, split_info
+
+def _check_dummy_names(df: pd.DataFrame, processed: pd.DataFrame):
+    """
+    ダミー列の列名が既存の列と重なる（例: 列「Q1_2」がある表で Q1 の選択肢「2」）か、
+    別の列のダミー列と重なる（例: Q1 の「2_3」と Q1_2 の「3」）なら ValueError。
+    """
+    added = Counter(processed.columns) - Counter(df.columns)
+    existing = set(df.columns)
+    clashes = sorted(str(name) for name, n in added.items() if n > 1 or name in existing)
+    if clashes:
+        raise ValueError(f"ダミー列の列名が他の列と重なります: {', '.join(clashes[:10])}")
+
+# =========================
+# チャンク処理（大きなCSV）
+# =========================
+
+def read_csv_chunks(src, encoding: str, chunksize: int = CHUNK_ROWS):
+    """
+    src（パスまたはファイル）を chunksize 行ずつ読む。ファイルは先頭に戻してから読む。
+    チャンクごとに型の推定がぶれないよう、セルはすべて文字列として読む（空欄は欠損のまま）。
+    """
+    if hasattr(src, "seek"):
+        src.seek(0)
+    return pd.read_csv(src, encoding=encoding, dtype=str, chunksize=chunksize)
+
+def scan_number_text(chunks, sep: str = ":") -> list:
+    """1回目の読み込み：「列名_テキスト」を作る列（どこかの行で分割がある列）を列順で返す。"""
+    pattern = _number_text_pattern(sep)
+    columns, found = [], set()
+    for chunk in chunks:
+        columns = columns or list(chunk.columns)
+        for j, col in enumerate(chunk.columns):
+            if col not in found and _number_text_hits(chunk.iloc[:, j], sep, pattern) is not None:
+                found.add(col)
+    return [c for c in columns if c in found]
+
+def scan_multi_answers(chunks, sep: str = ";") -> dict:
+    """1回目の読み込み：sep を含む列 → 全行を通した最大分割数。"""
+    max_parts = {}
+    for chunk in chunks:
+        for j, col in enumerate(chunk.columns):
+            counted = _count_parts(chunk.iloc[:, j], sep)
+            if counted is None:
+                continue
+            values, has_sep = counted
+            n = int(values[has_sep].str.count(re.escape(sep)).max()) + 1
+            max_parts[col] = max(max_parts.get(col, 0), n)
+    return max_parts
+
+def scan_dummy_options(chunks, sep: str = ";", columns=None, max_options: int | None = DUMMY_MAX_OPTIONS) -> dict:
+    """
+    dummy_multi_answers 用の読み込み：列 → 全行を通した選択肢（文字列順）。
+    columns（scan_multi_answers で見つけた sep を含む列）だけを見る。選択肢が max_options を超えた列は外す。
+    """
+    columns = set(columns or ())
+    seen = {}
+    for chunk in chunks:
+        for j, col in enumerate(chunk.columns):
+            if col not in columns:
+                continue
+            s = chunk.iloc[:, j]
+            options = seen.setdefault(col, set())
+            options.update(_dummies(s[s.notna()].astype(str), sep).columns)
+            if max_options is not None and len(options) > max_options:
+                columns.discard(col)
+                del seen[col]
+    return {col: sorted(options) for col, options in seen.items()}
+
+def stream_output_paths(name: str, fmt: str = "csv") -> tuple[Path, Path]:
+    """STREAM_OUT_DIR に (処理済み, 分割情報) のファイルのパスを用意する（fmt は tableio の形式）。古い出力はここで消す。"""
+    STREAM_OUT_DIR.mkdir(parents=True, exist_ok=True)
+    cutoff = time.time() - STREAM_OUT_KEEP_HOURS * 3600
+    for old in STREAM_OUT_DIR.iterdir():
+        try:
+            if old.stat().st_mtime < cutoff:
+                old.unlink()
+        except OSError:
+            pass
+    stem = f"{Path(name).stem}_{uuid.uuid4().hex[:8]}"
+    suffix = TABLE_SUFFIXES[fmt]
+    return STREAM_OUT_DIR / f"{stem}_processed{suffix}", STREAM_OUT_DIR / f"{stem}_split_info{suffix}"
+
+def _write_chunks(open_chunks, split_chunk, out_path, info_path=None, fmt: str = "csv") -> tuple[int, int]:
+    """
+    open_chunks() の各チャンクを split_chunk(chunk, 先頭の行位置) で処理して、fmt のファイルに追記していく。
+    CSV は utf-8-sig。Parquet / Feather はダミー列（uint8）以外を文字列として書く。
+    """
+    n_rows = n_info = 0
+    with TableWriter(out_path, fmt) as out, \
+            (TableWriter(info_path, fmt) if info_path else nullcontext()) as info_out:
+        for chunk in open_chunks():
+            processed, info = split_chunk(chunk, n_rows)
+            out.write(processed)
+            if info_out is not None and info:
+                info_out.write(pd.DataFrame(info))
+            n_rows += len(chunk)
+            n_info += len(info)
+    return n_rows, n_info
+
+def stream_split_number_text(
+    open_chunks, out_path, sep: str = ":", info_path=None, workers: int = 1, fmt: str = "csv"
+) -> tuple[int, int]:
+    """
+    split_number_text のチャンク版。open_chunks は呼ぶたびに先頭からのチャンクを返す関数（2回読む）。
+    (行数, 分割したセル数) を返す。workers は split_number_text と同じ（チャンクごとに列を並列処理し、
+    プロセスプールは全チャンクで1つを使い回す）。
+    fmt は出力の形式（csv / parquet / feather）。
+    """
+    text_cols = set(scan_number_text(open_chunks(), sep))
+
+    with split_pool(workers) as pool:
+        def split_chunk(chunk, offset):
+            return split_number_text(chunk, sep, text_cols, offset, workers, pool)
+
+        return _write_chunks(open_chunks, split_chunk, out_path, info_path, fmt)
+
+def stream_split_multi_answers(
+    open_chunks, out_path, sep: str = ";", info_path=None, workers: int = 1, fmt: str = "csv"
+) -> tuple[int, int]:
+    """
+    split_multi_answers のチャンク版。1回目で列ごとの最大分割数を数え、2回目で分割して書く。
+    (行数, 分割したセル数) を返す。
+    """
+    max_parts = scan_multi_answers(open_chunks(), sep)
+
+    with split_pool(workers) as pool:
+        def split_chunk(chunk, offset):
+            return split_multi_answers(chunk, sep, max_parts, offset, workers, pool)
+
+        return _write_chunks(open_chunks, split_chunk, out_path, info_path, fmt)
+
+def stream_dummy_multi_answers(
+    open_chunks, out_path, sep: str = ";", info_path=None, workers: int = 1, fmt: str = "csv"
+) -> tuple[int, int]:
+    """
+    dummy_multi_answers のチャンク版。sep を含む列と選択肢を先に2回の読み込みで決め、3回目で展開して書く。
+    (行数, 分割したセル数) を返す。
+    """
+    options = scan_dummy_options(open_chunks(), sep, scan_multi_answers(open_chunks(), sep))
+
+    with split_pool(workers) as pool:
+        def split_chunk(chunk, offset):
+            return dummy_multi_answers(chunk, sep, options, row_offset=offset, workers=workers, pool=pool)
+
+        return _write_chunks(open_chunks, split_chunk, out_path, info_path, fmt)
@@ -0,0 +1,191 @@
+"""
+表データの読み書き（CSV / Parquet / Feather）。
+
+- read_table     : 形式は中身の先頭バイトで判定する（PAR1 → Parquet、ARROW1 → Feather、それ以外は CSV）
+- write_table    : パスまたはファイルに書く。CSV は utf-8-sig
+- table_to_bytes : ダウンロード用に bytes にする
+- TableWriter    : チャンクごとに追記する（分割ツールのチャンク処理用）
+
+Parquet / Feather は pyarrow があるときだけ使える（AVAILABLE_FORMATS）。文字列列は辞書エンコードして書くので、
+同じ値が何度も出るアンケートの回答はファイルが小さく、読み戻しも CSV の解析よりずっと速い。
+読み込み時は辞書を解いて普通の文字列列に戻す（カテゴリ型にはしない）。
+"""
+from io import BytesIO
+from pathlib import Path
+
+import pandas as pd
+
+TABLE_SUFFIXES = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather"}
+TABLE_LABELS = {"csv": "CSV", "parquet": "Parquet", "feather": "Feather"}
+TABLE_MIMES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "feather": "application/vnd.apache.arrow.file",
+}
+_MAGIC = ((b"PAR1", "parquet"), (b"ARROW1", "feather"))
+
+try:
+    import pyarrow  # noqa: F401
+except ImportError:
+    AVAILABLE_FORMATS = ("csv",)
+else:
+    AVAILABLE_FORMATS = ("csv", "parquet", "feather")
+
+def sniff_format(src) -> str:
+    """src（パス・ファイル・bytes）の先頭バイトから形式を返す。ファイルは読んだ位置を元に戻す。"""
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        head = bytes(src[:8])
+    elif hasattr(src, "read"):
+        pos = src.tell()
+        head = src.read(8)
+        src.seek(pos)
+    else:
+        with open(src, "rb") as f:
+            head = f.read(8)
+    for magic, fmt in _MAGIC:
+        if head.startswith(magic):
+            return fmt
+    return "csv"
+
+def _plain_strings(table):
+    """辞書エンコードした列を普通の文字列列に戻す。"""
+    import pyarrow as pa
+
+    fields = [
+        pa.field(f.name, f.type.value_type) if pa.types.is_dictionary(f.type) else f
+        for f in table.schema
+    ]
+    return table.cast(pa.schema(fields))
+
+def _all_strings(table):
+    """全列を文字列にして、欠損は空文字にする（CSV を dtype=str, keep_default_na=False で読んだのと同じ）。"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    return pa.Table.from_arrays(
+        [pc.fill_null(col.cast(pa.string()), "") for col in table.columns], names=table.column_names
+    )
+
+def read_table(src, as_str: bool = False, nrows: int | None = None) -> pd.DataFrame:
+    """
+    CSV / Parquet / Feather を読む。as_str=True なら全列を文字列で読み、欠損は空文字にする。
+    CSV の読み方は pd.read_csv の既定（as_str なら dtype=str, keep_default_na=False）。
+    nrows を渡すと先頭の nrows 行だけ返す（表示用）。
+    """
+    if isinstance(src, (bytes, bytearray)):
+        src = BytesIO(src)
+    fmt = sniff_format(src)
+    if fmt == "csv":
+        if as_str:
+            return pd.read_csv(src, dtype=str, keep_default_na=False, nrows=nrows)
+        return pd.read_csv(src, nrows=nrows)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(src)
+    else:
+        import pyarrow.feather as feather
+
+        table = feather.read_table(src)
+    if nrows is not None:
+        table = table.slice(0, nrows)
+    table = _all_strings(table) if as_str else _plain_strings(table)
+    return table.to_pandas()
+
+def _to_arrow(df: pd.DataFrame, as_str: bool = False, dictionary: bool = True):
+    """
+    DataFrame → pyarrow.Table。dictionary=True なら文字列列は辞書エンコードする。
+    object 列（型が混ざりうる）は値を文字列にしてから渡し、疎な列は密にする。as_str=True なら整数列
+    （ダミー列）以外を文字列にする（チャンクごとに型がぶれても同じスキーマで書けるように）。
+    """
+    import pyarrow as pa
+
+    arrays = []
+    for j in range(df.shape[1]):
+        s = df.iloc[:, j]
+        if isinstance(s.dtype, pd.SparseDtype):
+            s = s.sparse.to_dense()
+        elif s.dtype == object:
+            s = s.where(s.isna(), s.astype(str))
+        arr = pa.array(s, from_pandas=True)
+        if (as_str and not pa.types.is_integer(arr.type)) or pa.types.is_null(arr.type):
+            arr = arr.cast(pa.string())
+        if dictionary and (pa.types.is_string(arr.type) or pa.types.is_large_string(arr.type)):
+            arr = arr.dictionary_encode()
+        arrays.append(arr)
+    return pa.Table.from_arrays(arrays, names=[str(c) for c in df.columns])
+
+def write_table(df: pd.DataFrame, dest, fmt: str = "csv"):
+    """df を dest（パスまたはファイル）に fmt で書く。index は書かない。"""
+    if fmt == "csv":
+        df.to_csv(dest, index=False, encoding="utf-8-sig")
+    elif fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        pq.write_table(_to_arrow(df), dest, compression="zstd")
+    elif fmt == "feather":
+        import pyarrow.feather as feather
+
+        feather.write_feather(_to_arrow(df), dest, compression="zstd")
+    else:
+        raise ValueError(f"unknown table format: {fmt}")
+
+def table_to_bytes(df: pd.DataFrame, fmt: str = "csv") -> bytes:
+    if fmt == "csv":
+        return df.to_csv(index=False).encode("utf-8-sig")
+    buf = BytesIO()
+    write_table(df, buf, fmt)
+    return buf.getvalue()
+
+class TableWriter:
+    """
+    チャンクを順に追記して1つのファイルにする。CSV はヘッダーを最初のチャンクだけに書く。
+    Parquet / Feather は整数列（ダミー列）以外を文字列として書く（チャンクごとに型推定がぶれてもスキーマを揃えるため）。
+    Feather（Arrow IPC ファイル）はバッチごとに辞書を差し替えられないので、辞書エンコードしない。
+    """
+
+    def __init__(self, path, fmt: str = "csv"):
+        if fmt not in TABLE_SUFFIXES:
+            raise ValueError(f"unknown table format: {fmt}")
+        self.path = Path(path)
+        self.fmt = fmt
+        self.n_rows = 0
+        self._out = None
+        self._closed = False
+
+    def write(self, df: pd.DataFrame):
+        first = self._out is None
+        if self.fmt == "csv":
+            if first:
+                self._out = open(self.path, "w", encoding="utf-8-sig", newline="")
+            df.to_csv(self._out, index=False, header=first)
+        else:
+            table = _to_arrow(df, as_str=True, dictionary=(self.fmt == "parquet"))
+            if first:
+                self._out = self._open_arrow(table.schema)
+            self._out.write_table(table)
+        self.n_rows += len(df)
+
+    def _open_arrow(self, schema):
+        if self.fmt == "parquet":
+            import pyarrow.parquet as pq
+
+            return pq.ParquetWriter(self.path, schema, compression="zstd")
+        import pyarrow.ipc as ipc
+
+        return ipc.new_file(str(self.path), schema, options=ipc.IpcWriteOptions(compression="zstd"))
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._out is None:
+            self.path.touch()  # 1チャンクも来なかったときも、空のファイルは作っておく
+        else:
+            self._out.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
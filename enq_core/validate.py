@@ -0,0 +1,214 @@
+"""
+OCR 値の検証ルール（⚠ 判定）。
+
+- flag_cell : 1セルだけ判定する（従来どおり）
+- FlagTable : 全回答者 × 全設問をまとめて判定し、⚠ の行列と理由コードを持つ。
+              ページ反映時は変わったセルだけ再判定する。
+
+Streamlit に依存しないので、レビュアー以外（バッチ処理など）からも import できる。
+"""
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from .tableio import read_table
+
+# 理由コード → 表示文言（0 は「問題なし」）
+REASON_OK = 0
+REASON_EMPTY = 1
+REASON_SINGLE_AMBIGUOUS = 2
+REASON_SINGLE_OUT = 3
+REASON_MULTI_AMBIGUOUS = 4
+REASON_MULTI_OUT = 5
+
+REASON_LABELS = {
+    REASON_OK: "",
+    REASON_EMPTY: "未回答（空欄）",
+    REASON_SINGLE_AMBIGUOUS: "単一選択なのに複数/解釈不能",
+    REASON_SINGLE_OUT: "単一選択の範囲外",
+    REASON_MULTI_AMBIGUOUS: "複数選択なのに解釈不能",
+    REASON_MULTI_OUT: "複数選択の範囲外",
+}
+
+_NUM_RE = re.compile(r"\d+")
+
+def norm_qid(s: str) -> str:
+    return unicodedata.normalize("NFKC", (s or "")).strip()
+
+def parse_choices(choice_str: str):
+    allowed = set()
+    if not choice_str:
+        return allowed
+    parts = choice_str.split("|")
+    for p in parts:
+        m = re.match(r"\s*([0-9]+)\s*:", p)
+        if m:
+            allowed.add(m.group(1))
+    return allowed
+
+# =========================
+# Loaders
+# =========================
+
+def read_ocr_csv(src) -> pd.DataFrame:
+    """
+    OCR出力（パスまたはファイルオブジェクト）を全列文字列で読む。回答者番号がなければ連番を振る。
+    CSV のほか Parquet / Feather も読める（形式は中身で判定、enq_core.tableio）。
+    """
+    df = read_table(src, as_str=True)
+    if "回答者番号" not in df.columns:
+        df.insert(0, "回答者番号", [str(i) for i in range(1, len(df) + 1)])
+    else:
+        df["回答者番号"] = df["回答者番号"].astype(str)
+    return df
+
+def read_master_csv(src) -> pd.DataFrame:
+    m = pd.read_csv(src, dtype=str, keep_default_na=False)
+    for col in ["設問ID", "設問文", "形式", "type", "選択肢"]:
+        if col not in m.columns:
+            m[col] = ""
+    return m
+
+def build_qid_to_page(template: dict) -> dict:
+    """設問ID → 論理ページ（複数ページにある設問は最初のページ）。"""
+    qid_to_page = {}
+    for pno, qmap in template.get("pages", {}).items():
+        for q in qmap.keys():
+            if q not in qid_to_page:
+                qid_to_page[q] = int(pno)
+    return qid_to_page
+
+def build_meta(mdf: pd.DataFrame) -> dict:
+    """設問マスタから {正規化qid: {"type", "allowed"}} を作る。"""
+    meta = {}
+    qid_col = None
+    for c in ["設問ID", "qid", "QID", "設問番号", "問ID"]:
+        if c in mdf.columns:
+            qid_col = c
+            break
+    if not qid_col:
+        return meta
+    for _, r in mdf.iterrows():
+        qid = str(r.get(qid_col, "")).strip()
+        if not qid:
+            continue
+        typ = str(r.get("type", "")).strip().lower()
+        if typ not in ("single", "multi", "other"):
+            typ = "other"
+        choice_str = str(r.get("選択肢", "")).strip()
+        allowed = parse_choices(choice_str)
+        meta[norm_qid(qid)] = {"type": typ, "allowed": allowed}
+    return meta
+
+def check_value(val, typ: str, allowed: set) -> tuple[int, str]:
+    """1つの値を判定し、(理由コード, 表示用の理由) を返す。"""
+    v = "" if val is None else str(val).strip()
+
+    # 未回答は必ず⚠
+    if v == "":
+        return REASON_EMPTY, REASON_LABELS[REASON_EMPTY]
+
+    if typ == "single":
+        nums = _NUM_RE.findall(v)
+        if len(nums) != 1:
+            return REASON_SINGLE_AMBIGUOUS, REASON_LABELS[REASON_SINGLE_AMBIGUOUS]
+        if allowed and nums[0] not in allowed:
+            return REASON_SINGLE_OUT, f"{REASON_LABELS[REASON_SINGLE_OUT]}: {nums[0]}"
+        return REASON_OK, ""
+
+    if typ == "multi":
+        nums = _NUM_RE.findall(v)
+        if len(nums) == 0:
+            return REASON_MULTI_AMBIGUOUS, REASON_LABELS[REASON_MULTI_AMBIGUOUS]
+        if allowed:
+            bad = [n for n in nums if n not in allowed]
+            if bad:
+                return REASON_MULTI_OUT, f"{REASON_LABELS[REASON_MULTI_OUT]}: {','.join(bad)}"
+        return REASON_OK, ""
+
+    return REASON_OK, ""
+
+def flag_cell(qid: str, val: str, meta: dict):
+    info = meta.get(norm_qid(qid), {})
+    code, reason = check_value(val, info.get("type", "other"), info.get("allowed", set()))
+    return code != REASON_OK, reason
+
+# =========================
+# FlagTable（列単位の一括判定）
+# =========================
+
+class FlagTable:
+    """
+    df の全行 × 判定対象列の ⚠ 判定を NumPy 配列で持つ。
+    - codes[i, j]   : 理由コード（REASON_*、0 なら問題なし）
+    - reasons[i, j] : 表示用の理由
+    行は df の並び順（位置）、列は self.columns の並び。
+
+    回答の種類は列ごとに少ない（"1", "2", "1,3" …）ので、列内のユニーク値だけを
+    判定して、結果を factorize のコードで全行に配る。
+    """
+
+    def __init__(self, df: pd.DataFrame, meta: dict, id_col: str = "回答者番号"):
+        self.meta = meta
+        self.columns = [c for c in df.columns if c != id_col]
+        self.col_pos = {c: j for j, c in enumerate(self.columns)}
+        n, m = len(df), len(self.columns)
+        self.codes = np.zeros((n, m), dtype=np.int8)
+        self.reasons = np.full((n, m), "", dtype=object)
+        for j, col in enumerate(self.columns):
+            self._fill_column(j, df[col])
+
+    def _rule(self, col: str) -> tuple[str, set]:
+        info = self.meta.get(norm_qid(col), {})
+        return info.get("type", "other"), info.get("allowed", set())
+
+    def _fill_column(self, j: int, series: pd.Series):
+        typ, allowed = self._rule(self.columns[j])
+        codes, uniques = pd.factorize(series.fillna("").astype(str), use_na_sentinel=False)
+        results = [check_value(u, typ, allowed) for u in uniques]
+        u_codes = np.array([r[0] for r in results], dtype=np.int8)
+        u_reasons = np.array([r[1] for r in results], dtype=object)
+        self.codes[:, j] = u_codes[codes]
+        self.reasons[:, j] = u_reasons[codes]
+
+    @property
+    def flags(self) -> np.ndarray:
+        return self.codes != REASON_OK
+
+    def update_cells(self, row_pos: int, values: dict):
+        """ページ反映などで変わったセルだけ再判定する。values は {列名: 新しい値}。"""
+        for col, val in values.items():
+            j = self.col_pos.get(col)
+            if j is None:
+                continue
+            typ, allowed = self._rule(col)
+            self.codes[row_pos, j], self.reasons[row_pos, j] = check_value(val, typ, allowed)
+
+    def cell(self, row_pos: int, col: str) -> tuple[bool, str]:
+        j = self.col_pos.get(col)
+        if j is None:
+            return False, ""
+        return bool(self.codes[row_pos, j] != REASON_OK), self.reasons[row_pos, j]
+
+    def flagged_cells(self, row_pos: int | None = None) -> pd.DataFrame:
+        """⚠ のセルを縦長の表（行位置, 設問ID, 理由コード, 理由）で返す。"""
+        codes = self.codes if row_pos is None else self.codes[row_pos:row_pos + 1]
+        ii, jj = np.nonzero(codes)
+        if row_pos is not None:
+            ii = ii + row_pos
+        return pd.DataFrame({
+            "row": ii,
+            "設問ID": np.array(self.columns, dtype=object)[jj] if len(jj) else np.array([], dtype=object),
+            "code": self.codes[ii, jj],
+            "理由": self.reasons[ii, jj],
+        })
+
+    def summary(self) -> pd.DataFrame:
+        """理由コード別の ⚠ 件数。"""
+        counts = np.bincount(self.codes.ravel().astype(np.int64), minlength=len(REASON_LABELS))
+        return pd.DataFrame([
+            {"理由": REASON_LABELS[c], "件数": int(counts[c])}
+            for c in REASON_LABELS if c != REASON_OK
+        ])
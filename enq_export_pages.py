@@ -0,0 +1,69 @@
+"""
+回答PDFのページ画像を前もって書き出すコマンドラインツール（Streamlit 不要）。
+
+レビュアーは同じ置き場所（環境変数 ENQ_PAGE_STORE_DIR、既定はスクリプトの隣の page_store）に
+同じ PDF・同じ DPI の画像があれば、レンダリングせずにそれを表示する。
+
+    python enq_export_pages.py --pdf scan.pdf --dpi 220 [--worklist prevalidate_out/worklist.csv]
+
+--worklist に enq_prevalidate.py の worklist.csv を渡すと、⚠ のあるページだけを書き出す。
+"""
+import argparse
+import hashlib
+import os
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from enq_core.render import STORE_FORMATS, export_pages
+
+# レビュアー（enq_page_reviewer_upload5.py）の PAGE_STORE_DIR と同じ既定値
+PAGE_STORE_DIR = Path(os.environ.get("ENQ_PAGE_STORE_DIR", Path(__file__).resolve().parent / "page_store"))
+
+def pdf_key_of(path) -> str:
+    # レビュアーの upload_digest() と同じ鍵（アップロードしたPDFと突き合わせる）
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="回答PDFのページ画像を並列で書き出す")
+    ap.add_argument("--pdf", required=True, help="回答PDF")
+    ap.add_argument("--dpi", type=int, default=220, help="レビュアーの「PDF→画像 DPI」と揃える")
+    ap.add_argument("--fmt", choices=STORE_FORMATS, default="webp", help="画像形式（どちらも可逆）")
+    ap.add_argument("--worklist", help="worklist.csv（指定時は PDFページindex 列のページだけ書き出す）")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="並列プロセス数")
+    ap.add_argument("--out", default=PAGE_STORE_DIR, type=Path, help="書き出し先")
+    args = ap.parse_args(argv)
+
+    import fitz  # PyMuPDF
+
+    with fitz.open(args.pdf) as doc:
+        total_pages = len(doc)
+
+    if args.worklist:
+        wl = pd.read_csv(args.worklist, encoding="utf-8-sig")
+        pages = sorted({int(i) for i in wl["PDFページindex"] if 0 <= int(i) < total_pages})
+    else:
+        pages = list(range(total_pages))
+
+    pdf_key = pdf_key_of(args.pdf)
+    t0 = time.perf_counter()
+
+    def progress(done, total):
+        if done == total or done % 50 == 0:
+            print(f"\r{done}/{total} ページ", end="", file=sys.stderr)
+
+    manifest = export_pages(args.pdf, pdf_key, args.out, pages, args.dpi, fmt=args.fmt,
+                            workers=args.workers, progress=progress)
+    print(file=sys.stderr)
+    print(f"書き出し済み {len(manifest['pages'])} ページ（今回 {time.perf_counter() - t0:.1f} 秒）")
+    print(f"出力: {(Path(args.out) / pdf_key / str(args.dpi)).resolve()}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
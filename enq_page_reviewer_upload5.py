@@ -1,27 +1,60 @@
+from __future__ import annotations  # pd.DataFrame などの注釈を実行時に評価しない（遅延 import のため）
+
 import json
 from io import BytesIO
 from pathlib import Path
 from datetime import datetime
 import re
-import unicodedata
 import time
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import uuid
 
-import fitz  # PyMuPDF
-import pandas as pd
 import streamlit as st
-from PIL import Image, ImageDraw, ImageFont
+
+from enq_core.perf import Profiler, StageTimer
+# PyMuPDF・pandas・PIL と、それを使う enq_core のモジュールはアップロードが揃ってから import する（後述）
 
 # =========================
 # Autosave / Checkpoint
 # =========================
 APP_DIR = Path(__file__).resolve().parent
-
-# ★ repo同梱フォント（GitHubに置いた実ファイル名に合わせる）
+# enq_core.overlay.BUNDLED_FONT と同じファイル（フォントチェック用。overlay を import すると PIL を読み込むので）
 BUNDLED_FONT = APP_DIR / "assets" / "fonts" / "NotoSansCJKjp-Regular.otf"
 
 AUTOSAVE_DIR = APP_DIR / "autosave"
 AUTOSAVE_DIR.mkdir(exist_ok=True)
 
+# チェックポイントの保持方針：直近 N 件は必ず残し、それより古いものは1日1件（その日の最後）を
+# 直近 D 日分だけ残す。一覧は manifest（JSON）で管理し、毎回 glob / stat しない。
+CHECKPOINT_KEEP_LAST = 20
+CHECKPOINT_KEEP_DAYS = 30
+CHECKPOINT_MANIFEST = AUTOSAVE_DIR / "checkpoints_manifest.json"
+
+# 反映ごとの変更は journal に追記し、この件数ごとに CSV（スナップショット）へまとめ直す
+JOURNAL_COMPACT_EVERY = 500
+
+# 自動保存・チェックポイントの形式（csv / parquet / feather）。parquet / feather は pyarrow が必要で、
+# 大きなCSVでも書き出し・復元がほぼ一瞬になる。使えない形式が指定されたら csv にする（読み込み後に確認）
+AUTOSAVE_FORMAT = os.environ.get("ENQ_AUTOSAVE_FORMAT", "csv")
+AUTOSAVE_SUFFIXES = (".csv", ".parquet", ".feather")  # 復元の一覧には形式によらず出す
+
+# 先読み（レンダリング済みページのキャッシュ）
+# 予算(MB)と格納形式（raw / png / webp）は環境変数で上書きできる
+PAGE_CACHE_MAX_MB = int(os.environ.get("ENQ_PAGE_CACHE_MB", "512"))
+PAGE_CACHE_FORMAT = os.environ.get("ENQ_PAGE_CACHE_FORMAT", "png")
+PREFETCH_WORKERS = 2
+# enq_export_pages.py の書き出し先（同じPDF・同じDPIの画像があればレンダリングしない）。
+# 既定はどちらもスクリプトの隣の page_store（起動したディレクトリによらず同じ場所を見る）
+PAGE_STORE_DIR = Path(os.environ.get("ENQ_PAGE_STORE_DIR", APP_DIR / "page_store"))
+
+# アップロードPDFの置き場（内容ハッシュ名で1回だけ書き出し、以後はパスから開く）
+PDF_SPOOL_DIR = Path(os.environ.get("ENQ_PDF_SPOOL_DIR", Path(tempfile.gettempdir()) / "enq_pdf_spool"))
+PDF_SPOOL_KEEP_HOURS = 24
+
 def stem_from_name(name: str, fallback="ocr_output"):
     try:
         return Path(name).stem or fallback
@@ -32,9 +65,13 @@ def progress_path_for(base: str, datestr: str | None = None) -> Path:
     datestr = datestr or datetime.now().strftime("%Y%m%d")
     return AUTOSAVE_DIR / f"{base}_{datestr}_progress.json"
 
+def autosave_path_for(base: str, datestr: str | None = None) -> Path:
+    datestr = datestr or datetime.now().strftime("%Y%m%d")
+    return AUTOSAVE_DIR / f"{base}_{datestr}_autosave.{AUTOSAVE_FORMAT}"
+
 def checkpoint_paths_for(base: str) -> tuple[Path, Path]:
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    csv_path = AUTOSAVE_DIR / f"{base}_checkpoint_{ts}.csv"
+    csv_path = AUTOSAVE_DIR / f"{base}_checkpoint_{ts}.{AUTOSAVE_FORMAT}"
     prog_path = AUTOSAVE_DIR / f"{base}_checkpoint_{ts}_progress.json"
     return csv_path, prog_path
 
@@ -53,19 +90,152 @@ def save_progress_file(progress_path: Path, autosave_path: str = ""):
 def load_progress(progress_path: Path) -> dict:
     return json.loads(progress_path.read_text(encoding="utf-8"))
 
-def save_checkpoint(base: str, df_edit: pd.DataFrame, reason: str = "manual") -> tuple[str, str]:
-    """編集途中を退避（未反映でもOK）。CSV＋progressを保存してパスを返す。"""
-    csv_path, prog_path = checkpoint_paths_for(base)
-    df_edit.to_csv(csv_path, index=False, encoding="utf-8-sig")
 
-    # checkpointのprogressはこのcheckpoint CSVを autosave_path として記録
-    save_progress_file(prog_path, autosave_path=str(csv_path))
+@st.cache_resource
+def manifest_lock() -> threading.Lock:
+    # 再実行・セッション・バックグラウンドの整理処理をまたいで共有する
+    return threading.Lock()
+
+@st.cache_resource
+def live_autosave_paths() -> dict[str, str]:
+    # セッション → いまスナップショットとして使っているファイル（manifest_lock の中で読み書きする）。
+    # 整理処理はここにあるチェックポイントを消さない
+    return {}
+
+def is_checkpoint_path(path: str) -> bool:
+    return re.match(r"(.+)_checkpoint_(\d{8}_\d{6})$", Path(path).stem) is not None
+
+def _read_manifest() -> dict:
+    if CHECKPOINT_MANIFEST.exists():
+        try:
+            return json.loads(CHECKPOINT_MANIFEST.read_text(encoding="utf-8"))
+        except json.JSONDecodeError:
+            pass
+    # manifest がない（または壊れた）ときだけ、既存のチェックポイントを1回拾って作る
+    manifest = {}
+    for csv_path in sorted(p for sfx in AUTOSAVE_SUFFIXES for p in AUTOSAVE_DIR.glob(f"*_checkpoint_*{sfx}")):
+        m = re.match(r"(.+)_checkpoint_(\d{8}_\d{6})$", csv_path.stem)
+        if not m:
+            continue
+        manifest.setdefault(m.group(1), []).append({
+            "ts": m.group(2),
+            "digest": "",
+            "csv": str(csv_path),
+            "progress": str(csv_path.with_name(f"{csv_path.stem}_progress.json")),
+            "reason": "",
+        })
+    return manifest
+
+def _write_manifest(manifest: dict):
+    tmp = CHECKPOINT_MANIFEST.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=1), encoding="utf-8")
+    tmp.replace(CHECKPOINT_MANIFEST)
+
+def prune_checkpoints(base: str, lock: threading.Lock):
+    """保持方針から外れたチェックポイント（CSV＋progress＋journal）を削除する。
+    どこかのセッションが復元元として使っているものは、保持方針から外れていても残す。"""
+    with lock:
+        manifest = _read_manifest()
+        in_use = set(live_autosave_paths().values())
+        entries = sorted(manifest.get(base, []), key=lambda e: e["ts"])
+        keep = entries[-CHECKPOINT_KEEP_LAST:]
+        older = entries[:-CHECKPOINT_KEEP_LAST] if len(entries) > CHECKPOINT_KEEP_LAST else []
+        daily = {}
+        for e in older:
+            daily[e["ts"][:8]] = e  # 日ごとに最後のものが残る
+        keep_daily = [daily[d] for d in sorted(daily)[-CHECKPOINT_KEEP_DAYS:]]
+        kept_ids = {id(e) for e in keep_daily + keep}
+        kept_ids |= {id(e) for e in entries if e["csv"] in in_use}
+        kept = [e for e in entries if id(e) in kept_ids]
+        for e in entries:
+            if id(e) in kept_ids:
+                continue
+            for f in (e["csv"], e["progress"], journal_path_for(e["csv"])):
+                Path(f).unlink(missing_ok=True)
+        manifest[base] = kept
+        _write_manifest(manifest)
+
+def save_checkpoint(base: str, df_edit: pd.DataFrame, reason: str = "manual") -> tuple[str, str]:
+    """編集途中を退避（未反映でもOK）。CSV＋progressを保存してパスを返す。
+    内容が既存のチェックポイントと同じなら CSV は書かず、そのチェックポイントを返す。"""
+    digest = df_digest(df_edit)
+    with manifest_lock():
+        manifest = _read_manifest()
+        same = [e for e in manifest.get(base, []) if e["digest"] == digest and Path(e["csv"]).exists()]
+
+    if same:
+        csv_path, prog_path = Path(same[-1]["csv"]), Path(same[-1]["progress"])
+        # 位置・チェック状況は変わっているかもしれないので progress だけ更新
+        save_progress_file(prog_path, autosave_path=str(csv_path))
+    else:
+        csv_path, prog_path = checkpoint_paths_for(base)
+        write_table(df_edit, csv_path, AUTOSAVE_FORMAT)
+
+        # checkpointのprogressはこのcheckpoint CSVを autosave_path として記録
+        save_progress_file(prog_path, autosave_path=str(csv_path))
+
+        with manifest_lock():
+            manifest = _read_manifest()
+            # manifest を作り直した直後は、いま書いた CSV も拾われているので重複させない
+            entries = [e for e in manifest.get(base, []) if e["csv"] != str(csv_path)]
+            entries.append({
+                "ts": csv_path.stem.rsplit("_checkpoint_", 1)[1],
+                "digest": digest,
+                "csv": str(csv_path),
+                "progress": str(prog_path),
+                "reason": reason,
+            })
+            manifest[base] = entries
+            _write_manifest(manifest)
+        # 古いチェックポイントの削除は裏で行う
+        threading.Thread(target=prune_checkpoints, args=(base, manifest_lock()), daemon=True).start()
 
     st.session_state.last_checkpoint_time = time.time()
     st.session_state.last_checkpoint_csv = str(csv_path)
     st.session_state.last_checkpoint_reason = reason
     return str(csv_path), str(prog_path)
 
+@st.cache_data(show_spinner=False, max_entries=8)
+def list_autosave_files(dir_mtime_ns: int, patterns: tuple[str, ...]) -> list[Path]:
+    """AUTOSAVE_DIR 内の patterns のどれかに合うファイルを新しい順に返す。
+    ディレクトリの mtime をキーにしているので、ファイルの追加・削除がない限り glob / stat しない。"""
+    files = [(p.stat().st_mtime, p) for pattern in patterns for p in AUTOSAVE_DIR.glob(pattern)]
+    return [p for _, p in sorted(files, key=lambda t: t[0], reverse=True)]
+
+# =========================
+# Journal（反映の追記ログ：enq_core.review）
+# =========================
+# 反映のたびに全件CSVを書き直す代わりに、変わったセルだけを JSONL に追記する。
+# 自動保存CSV（スナップショット）＋ journal の再生 ＝ 最新の状態。
+
+def compact_autosave(base: str, df_edit: pd.DataFrame):
+    """
+    全件をスナップショットに書き出し、journal を空にする（progress もここで保存）。
+    形式はスナップショットの拡張子に合わせる。その形式が今は書けない（pyarrow がない等）ときは、
+    AUTOSAVE_FORMAT の拡張子のファイルに切り替える。
+    チェックポイントは書き換えない（manifest の digest と中身がずれ、重複判定が別の内容を返す）。
+    チェックポイントから復元したあとの最初の全件保存で、今日の自動保存ファイルに切り替える。
+    """
+    autosave_path = st.session_state.autosave_path
+    fmt = next((f for f, suffix in TABLE_SUFFIXES.items() if Path(autosave_path).suffix == suffix), None)
+    if is_checkpoint_path(autosave_path):
+        # チェックポイントの journal も残す（チェックポイントから復元したときに再生される）
+        autosave_path = str(autosave_path_for(base))
+        fmt = AUTOSAVE_FORMAT
+        st.session_state.autosave_path = autosave_path
+        with manifest_lock():
+            live_autosave_paths()[st.session_state.session_uid] = autosave_path
+    elif fmt not in AVAILABLE_FORMATS:
+        journal_path_for(autosave_path).unlink(missing_ok=True)  # 全件を書き直すので前の journal は要らない
+        autosave_path = str(Path(autosave_path).with_suffix(TABLE_SUFFIXES[AUTOSAVE_FORMAT]))
+        fmt = AUTOSAVE_FORMAT
+        st.session_state.autosave_path = autosave_path
+    write_table(df_edit, autosave_path, fmt)
+    journal_path_for(autosave_path).unlink(missing_ok=True)
+    save_progress_file(progress_path_for(base), autosave_path=autosave_path)
+    st.session_state.journal_snapshot = autosave_path
+    st.session_state.journal_count = 0
+
 # =========================
 # Pending restore (ウィジェット生成前に反映)
 # =========================
@@ -85,226 +255,108 @@ if "pending_restore" in st.session_state:
     if pr.get("current_page") is not None:
         st.session_state["current_page"] = pr["current_page"]
 
+# 修正キューからのページ移動も同じ理由で次回実行の最初に反映する
+if "pending_jump" in st.session_state:
+    pj = st.session_state.pop("pending_jump")
+    st.session_state["current_resp"] = pj["current_resp"]
+    st.session_state["current_page"] = pj["current_page"]
+
+# =========================
+# Overlay（描画は enq_core.overlay）
+# =========================
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def cached_overlay_layer(layer_key, w: int, h: int, show_labels: bool, _qid_to_bbox: dict) -> list:
+    # 赤枠＋問番号は値に依存しないので、テンプレ・ページ・dpi ごとに1回だけ作る
+    return build_overlay_layer(_qid_to_bbox, w, h, show_labels)
+
 # =========================
-# Utilities
+# Upload registry
 # =========================
+# 読み込み系のキャッシュには内容ハッシュ（digest）だけをキーとして渡し、
+# バイト列本体は引数名を _ 始まりにして Streamlit のハッシュ対象から外す。
+# ハッシュはアップロードごとに1回だけ計算して session_state に持っておく。
+
+def upload_digest(up_file, data: bytes | None = None) -> str:
+    """data を省略するとファイルから少しずつ読んでハッシュする（大きいPDF用にコピーを作らない）。"""
+    src = (up_file.name, up_file.size, getattr(up_file, "file_id", ""))
+    registry = st.session_state.setdefault("upload_digests", {})
+    if src not in registry:
+        if data is None:
+            h = hashlib.blake2b(digest_size=16)
+            up_file.seek(0)
+            for block in iter(lambda: up_file.read(1 << 20), b""):
+                h.update(block)
+            up_file.seek(0)
+            registry[src] = h.hexdigest()
+        else:
+            registry[src] = hashlib.blake2b(data, digest_size=16).hexdigest()
+    return registry[src]
 
-def _text_wh(draw, text, font):
-    # Pillowのバージョン差に強い順で試す
-    if hasattr(draw, "textbbox"):
-        l, t, r, b = draw.textbbox((0, 0), text, font=font)
-        return (r - l), (b - t)
-    if hasattr(font, "getbbox"):
-        l, t, r, b = font.getbbox(text)
-        return (r - l), (b - t)
-    if hasattr(font, "getsize"):
-        return font.getsize(text)
-    # 最後の保険
-    return (len(text) * 10, 20)
-
-
-
-def clamp01(v: float) -> float:
-    return max(0.0, min(1.0, v))
-
-def norm_qid(s: str) -> str:
-    return unicodedata.normalize("NFKC", (s or "")).strip()
-
-def denorm_bbox(b, w, h):
-    x0 = int(clamp01(float(b[0])) * w)
-    y0 = int(clamp01(float(b[1])) * h)
-    x1 = int(clamp01(float(b[2])) * w)
-    y1 = int(clamp01(float(b[3])) * h)
-    if x1 < x0:
-        x0, x1 = x1, x0
-    if y1 < y0:
-        y0, y1 = y1, y0
-    return x0, y0, x1, y1
-
-def draw_overlay_boxes(
-    img: Image.Image,
-    qid_to_bbox: dict,
-    qid_to_value: dict | None = None,
-    show_labels: bool = True,
-    show_values: bool = False,
-    value_font_size: int = 48,
-    value_alpha: int = 80,   # 0..255（例：80=約31%）
-    value_max_chars: int = 12,
-) -> Image.Image:
+def spool_pdf(up_file, digest: str) -> Path:
     """
-    - 赤枠＋問番号（show_labels）
-    - 枠内にOCR値を半透明で描画（show_values）
+    アップロードPDFを PDF_SPOOL_DIR/<digest>.pdf に書き出してパスを返す（既にあれば書かない）。
+    PyMuPDF はパスから開くと必要なページだけ読むので、PDF全体のコピーをメモリに持たずに済む。
     """
-    # ベースはRGBで受ける想定。合成用にRGBAにする
-    base = img.convert("RGBA")
-    overlay = Image.new("RGBA", base.size, (0, 0, 0, 0))
-    draw = ImageDraw.Draw(overlay)
-    # ★追加：画像サイズとラベルカウンタ
-    w, h = base.size
-    i = 0
-
-    # フォント（問番号）
-    font_label = None
-    for fp in [
-        str(BUNDLED_FONT),  # ★同梱フォントを最優先
-        "/usr/share/fonts/opentype/ipafont-gothic/ipag.ttf",
-        "/usr/share/fonts/truetype/fonts-japanese-gothic.ttf",
-        "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.otf",
-    ]:
-        try:
-            font_label = ImageFont.truetype(fp, 32)
-            break
-        except Exception:
-            pass
-    if font_label is None:
-        font_label = ImageFont.load_default()
-
-    # フォント（値表示）
-    font_value = None
-    for fp in [
-        str(BUNDLED_FONT),  # ★同梱フォントを最優先
-        "/usr/share/fonts/opentype/ipafont-gothic/ipag.ttf",
-        "/usr/share/fonts/truetype/fonts-japanese-gothic.ttf",
-        "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.otf",
-    ]:
+    path = PDF_SPOOL_DIR / f"{digest}.pdf"
+    if path.exists():
+        return path
+    PDF_SPOOL_DIR.mkdir(parents=True, exist_ok=True)
+    cutoff = time.time() - PDF_SPOOL_KEEP_HOURS * 3600
+    for old in PDF_SPOOL_DIR.glob("*.pdf"):
         try:
-            font_value = ImageFont.truetype(fp, value_font_size)
-            break
-        except Exception:
+            if old.stat().st_mtime < cutoff:
+                old.unlink()
+        except OSError:
             pass
-    if font_value is None:
-        font_value = ImageFont.load_default()
-
-    for qid, b in (qid_to_bbox or {}).items():
-        try:
-            x0, y0, x1, y1 = denorm_bbox(b, w, h)
-        except Exception:
-            continue
-
-        # 赤枠
-        draw.rectangle([x0, y0, x1, y1], outline=(255, 0, 0, 255), width=3)
-
-        # 問番号ラベル（枠の右上：右寄せ）
-        if show_labels:
-            dy = (i % 3) * 36
-            label = str(qid)
-
-            tw, th = _text_wh(draw, label, font_label)
-            pad = 4
-            x = x1 - pad - tw          # ← 右端から文字幅分だけ左へ
-            y = y0 + pad + dy
-
-            draw.text((x, y), label, fill=(255, 0, 0, 255), font=font_label)
-            i += 1
-
-
-        # 枠内OCR値（半透明）
-        if show_values and qid_to_value is not None:
-            raw = qid_to_value.get(qid, "")
-            txt = "" if raw is None else str(raw).strip()
-            if txt == "":
-                txt = "空"  # 未回答を見落としにくくする
-
-            # 長い場合は省略（最適化はしない方針なので単純に切る）
-            if len(txt) > value_max_chars:
-                txt = txt[:value_max_chars] + "…"
-
-            # 枠の中央に配置（枠が小さいと読めないがOK）
-            tw, th =  _text_wh(draw, txt, font_value)
-            cx = (x0 + x1) // 2
-            cy = (y0 + y1) // 2
-            tx = x0 + 50
-            ty = cy - th // 2
-
-            # 半透明色（青系）※必要なら黒でもOK
-            draw.text((tx, ty), txt, fill=(0, 0, 0, value_alpha), font=font_value)
-
-    # 合成してRGBで返す
-    out = Image.alpha_composite(base, overlay).convert("RGB")
-    return out
-
-@st.cache_data(show_spinner=False)
-def load_template_from_bytes(tpl_bytes: bytes) -> dict:
-    return json.loads(tpl_bytes.decode("utf-8"))
-
-@st.cache_data(show_spinner=False)
-def load_master_from_bytes(csv_bytes: bytes) -> pd.DataFrame:
-    m = pd.read_csv(BytesIO(csv_bytes), dtype=str, keep_default_na=False)
-    for col in ["設問ID", "設問文", "形式", "type", "選択肢"]:
-        if col not in m.columns:
-            m[col] = ""
-    return m
-
-@st.cache_data(show_spinner=False)
-def load_ocr_csv_from_bytes(csv_bytes: bytes) -> pd.DataFrame:
-    df = pd.read_csv(BytesIO(csv_bytes), dtype=str, keep_default_na=False)
-    if "回答者番号" not in df.columns:
-        df.insert(0, "回答者番号", [str(i) for i in range(1, len(df) + 1)])
-    else:
-        df["回答者番号"] = df["回答者番号"].astype(str)
-    return df
-
-@st.cache_data(show_spinner=False)
-def pdf_page_count_from_bytes(pdf_bytes: bytes) -> int:
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    return doc.page_count
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    up_file.seek(0)
+    with open(tmp, "wb") as f:
+        shutil.copyfileobj(up_file, f, 1 << 20)
+    up_file.seek(0)
+    os.replace(tmp, path)
+    return path
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_template_from_bytes(digest: str, _tpl_bytes: bytes) -> dict:
+    return json.loads(_tpl_bytes.decode("utf-8"))
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_master_from_bytes(digest: str, _csv_bytes: bytes) -> pd.DataFrame:
+    return read_master_csv(BytesIO(_csv_bytes))
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_ocr_csv_from_bytes(digest: str, _csv_bytes: bytes) -> pd.DataFrame:
+    return read_ocr_csv(BytesIO(_csv_bytes))
+
+# 開いたままの Document が溜まらないよう、保持数に上限をつける
+@st.cache_resource(max_entries=2)
+def open_pdf(digest: str, _pdf_path: Path):
+    return fitz.open(_pdf_path)
 
 @st.cache_resource
-def open_pdf(pdf_bytes: bytes):
-    return fitz.open(stream=pdf_bytes, filetype="pdf")
-
-
-def render_page(doc, page_index: int, dpi: int):
-    page = doc.load_page(page_index)
-    zoom = dpi / 72
-    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
-    return Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-
-
-def build_page_map(template: dict) -> dict:
-    pages = template.get("pages", {})
-    return {pno: list(qmap.keys()) for pno, qmap in pages.items()}
-
-def parse_choices(choice_str: str):
-    allowed = set()
-    if not choice_str:
-        return allowed
-    parts = choice_str.split("|")
-    for p in parts:
-        m = re.match(r"\s*([0-9]+)\s*:", p)
-        if m:
-            allowed.add(m.group(1))
-    return allowed
-
-def flag_cell(qid: str, val: str, meta: dict):
-    v = "" if val is None else str(val).strip()
-    info = meta.get(norm_qid(qid), {})
-    typ = info.get("type", "other")
-    allowed = info.get("allowed", set())
-
-    # 未回答は必ず⚠
-    if v == "":
-        return True, "未回答（空欄）"
-
-    if typ == "single":
-        nums = re.findall(r"\d+", v)
-        if len(nums) != 1:
-            return True, "単一選択なのに複数/解釈不能"
-        if allowed and nums[0] not in allowed:
-            return True, f"単一選択の範囲外: {nums[0]}"
-        return False, ""
-
-    if typ == "multi":
-        nums = re.findall(r"\d+", v)
-        if len(nums) == 0:
-            return True, "複数選択なのに解釈不能"
-        if allowed:
-            bad = [n for n in nums if n not in allowed]
-            if bad:
-                return True, f"複数選択の範囲外: {','.join(bad)}"
-        return False, ""
-
-    return False, ""
+def get_page_cache() -> PageCache:
+    # 全セッション共有（キーに pdf_key を含むので別PDFと混ざらない）。
+    # アップロード前でも「キャッシュをクリア」から呼ばれるので、ここで import する
+    from enq_core.render import PageCache
+
+    return PageCache(max_bytes=PAGE_CACHE_MAX_MB * 1024 * 1024, fmt=PAGE_CACHE_FORMAT)
+
+def _release_prefetcher(prefetcher: PagePrefetcher):
+    # キャッシュから外れたら（3つ目のPDFを開いた等）ワーカープロセスと先読み予約をすぐ片付ける
+    prefetcher.shutdown()
+
+@st.cache_resource(max_entries=2, on_release=_release_prefetcher)
+def get_prefetcher(pdf_key: str, _pdf_path: Path) -> PagePrefetcher:
+    return PagePrefetcher(
+        pdf_key, _pdf_path, get_page_cache(), workers=PREFETCH_WORKERS,
+        store=PageStore(PAGE_STORE_DIR, pdf_key),
+    )
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_qid_to_page(digest: str, _template: dict) -> dict:
+    # テンプレごとに1回だけ作る
+    return build_qid_to_page(_template)
 
 # =========================
 # UI
@@ -312,6 +364,25 @@ def flag_cell(qid: str, val: str, meta: dict):
 st.set_page_config(layout="wide")
 st.markdown("### アンケート OCR 修正ページレビュア（チェックポイント付き）")
 
+# 処理時間の計測：環境変数 ENQ_PERF=1 か URL に ?perf=1 を付けたときだけ有効
+PERF_ENABLED = os.environ.get("ENQ_PERF", "") == "1" or st.query_params.get("perf") == "1"
+perf: StageTimer = st.session_state.setdefault("perf", StageTimer(enabled=PERF_ENABLED))
+perf.enabled = PERF_ENABLED
+perf.begin_run()
+
+def stop_profiler():
+    """プロファイル中なら止めて、結果をサイドバー表示用に残す。"""
+    profiler = st.session_state.pop("perf_profiler", None)
+    if profiler is not None:
+        profiler.stop()
+        st.session_state.perf_profile = {"kind": profiler.kind, "report": profiler.report()}
+
+# 前回のプロファイルが st.stop() / st.rerun() で最後まで届かなかった場合は、ここで止めて結果を残す
+stop_profiler()
+if PERF_ENABLED and st.session_state.pop("perf_profile_next", False):
+    st.session_state.perf_profiler = Profiler()
+    st.session_state.perf_profiler.start()
+
 # フォントチェック（一時、後に消去）
 
 st.sidebar.write("BUNDLED_FONT:", str(BUNDLED_FONT))
@@ -319,7 +390,9 @@ st.sidebar.write("exists:", BUNDLED_FONT.exists())
 
 with st.sidebar:
     st.header("入力（アップロード）")
-    up_ocr = st.file_uploader("OCR出力CSV", type=["csv"])
+    up_ocr = st.file_uploader(
+        "OCR出力CSV", type=["csv", "parquet", "feather"], help="Parquet / Feather で書き出したものも読み込めます。",
+    )
     up_tpl = st.file_uploader("template.json", type=["json"])
     up_pdf = st.file_uploader("回答済みPDF", type=["pdf"])
     up_master = st.file_uploader("設問マスタCSV（任意）", type=["csv"])
@@ -328,6 +401,14 @@ with st.sidebar:
     st.header("表示")
     dpi = st.slider("PDF→画像 DPI", 150, 350, 220, 10)
     page_zoom = st.slider("ページ全体の表示倍率", 50, 200, 100, 10)
+    prefetch_pages = st.slider("先読みページ数（次ページ以降）", 0, 8, 3, 1)
+    view_mode = st.radio("画像の表示", ["ページ全体", "設問スニペット"], horizontal=True)
+    st.caption("設問スニペット：template の枠だけを切り出して高DPIで表示（ページ全体は描かないので軽い）")
+    snippet_dpi = st.slider("スニペット DPI", 150, 600, 300, 25)
+    snippet_cols = st.slider("スニペットの列数", 1, 4, 2, 1)
+    show_filmstrip = st.checkbox("回答者のページ一覧（サムネイル）を表示", value=True)
+    thumb_dpi = st.slider("サムネイル DPI", 18, 72, 30, 6)
+    filmstrip_cols = st.slider("サムネイルの列数", 4, 16, 8, 1)
 
     st.divider()
     st.subheader("照合オーバーレイ")
@@ -353,35 +434,82 @@ with st.sidebar:
     auto_cp_min = st.number_input("自動保存間隔（分）", min_value=1, value=10, step=1)
     st.caption("※未反映があるときだけ、操作タイミングで自動保存します。")
 
+    st.divider()
+    st.subheader("ページ画像キャッシュ")
+    cache_stats_box = st.empty()
+
     if st.button("🔄 キャッシュをクリア", width="stretch"):
         st.cache_data.clear()
+        get_page_cache().clear()
         st.success("キャッシュをクリアしました。")
         st.rerun()
 
+    if PERF_ENABLED:
+        st.divider()
+        st.subheader("処理時間（計測）")
+        perf_box = st.container()  # 中身は最後（全区間の計測後）に書く
+        pc1, pc2 = st.columns(2)
+        with pc1:
+            if st.button("次の再実行をプロファイル", width="stretch"):
+                st.session_state.perf_profile_next = True
+                st.rerun()
+        with pc2:
+            if st.button("計測をリセット", width="stretch"):
+                perf.reset()
+
 # 必須入力
 if not (up_ocr and up_tpl and up_pdf):
     st.info("左で **OCR出力CSV / template.json / 回答済みPDF** をアップロードしてください。")
     st.stop()
 
+# 重いモジュール（合わせて1秒前後）はここで初めて読み込む。
+# アップロード前の初回表示（起動直後・ヘルスチェック）では読み込まないので速く返せる。
+import fitz  # PyMuPDF  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from enq_core.overlay import badge_thumbnail, build_overlay_layer, draw_overlay_boxes  # noqa: E402
+from enq_core.render import PageCache, PagePrefetcher, PageStore  # noqa: E402
+from enq_core.review import (  # noqa: E402
+    RespondentIndex, append_journal, build_global_queue, build_page_map, df_digest, journal_path_for,
+    page_flag_counts, read_journal, replay_journal,
+)
+from enq_core.tableio import (  # noqa: E402
+    AVAILABLE_FORMATS, TABLE_LABELS, TABLE_MIMES, TABLE_SUFFIXES, read_table, table_to_bytes, write_table,
+)
+from enq_core.validate import (  # noqa: E402
+    REASON_LABELS, FlagTable, build_meta, build_qid_to_page, read_master_csv, read_ocr_csv,
+)
+
+if AUTOSAVE_FORMAT not in AVAILABLE_FORMATS:
+    AUTOSAVE_FORMAT = "csv"
+
 base = stem_from_name(up_ocr.name, fallback="ocr_output")
 
 ocr_bytes = up_ocr.getvalue()
 tpl_bytes = up_tpl.getvalue()
-pdf_bytes = up_pdf.getvalue()
 master_bytes = up_master.getvalue() if up_master else None
 
-template = load_template_from_bytes(tpl_bytes)
-page_map = build_page_map(template)
+with perf.stage("CSV読込"):
+    ocr_key = upload_digest(up_ocr, ocr_bytes)
+    df_raw = load_ocr_csv_from_bytes(ocr_key, ocr_bytes)
 
-df_raw = load_ocr_csv_from_bytes(ocr_bytes)
+with perf.stage("テンプレ解析"):
+    tpl_key = upload_digest(up_tpl, tpl_bytes)
+    template = load_template_from_bytes(tpl_key, tpl_bytes)
+    page_map = build_page_map(template)
+    qid_to_page = load_qid_to_page(tpl_key, template)
 
-doc = open_pdf(pdf_bytes)
-total_pages = doc.page_count
+with perf.stage("PDFを開く"):
+    pdf_key = upload_digest(up_pdf)
+    pdf_path = spool_pdf(up_pdf, pdf_key)
+    doc = open_pdf(pdf_key, pdf_path)
+    total_pages = doc.page_count
 
 # 復元（CSV）
 if "restore_path" in st.session_state and st.session_state.restore_path:
     try:
-        df_raw = pd.read_csv(st.session_state.restore_path, dtype=str, keep_default_na=False)
+        df_raw = read_table(st.session_state.restore_path, as_str=True)  # 形式は中身で判定
+        df_raw, _ = replay_journal(df_raw, read_journal(st.session_state.restore_path))
         st.success(f"自動保存から復元しました: {Path(st.session_state.restore_path).name}")
     except Exception as e:
         st.error(f"復元に失敗: {e}")
@@ -404,29 +532,33 @@ df_edit: pd.DataFrame = st.session_state.df_edit
 
 # 自動保存先（反映用）
 if "autosave_path" not in st.session_state or not st.session_state.autosave_path:
-    datestr = datetime.now().strftime("%Y%m%d")
-    st.session_state.autosave_path = str(AUTOSAVE_DIR / f"{base}_{datestr}_autosave.csv")
+    st.session_state.autosave_path = str(autosave_path_for(base))
+if "session_uid" not in st.session_state:
+    st.session_state.session_uid = uuid.uuid4().hex
+with manifest_lock():
+    live_autosave_paths()[st.session_state.session_uid] = st.session_state.autosave_path
 
 # メタ（type・選択肢）
 meta = {}
+master_key = ""
 if master_bytes:
-    mdf = load_master_from_bytes(master_bytes)
-    qid_col = None
-    for c in ["設問ID", "qid", "QID", "設問番号", "問ID"]:
-        if c in mdf.columns:
-            qid_col = c
-            break
-    if qid_col:
-        for _, r in mdf.iterrows():
-            qid = str(r.get(qid_col, "")).strip()
-            if not qid:
-                continue
-            typ = str(r.get("type", "")).strip().lower()
-            if typ not in ("single", "multi", "other"):
-                typ = "other"
-            choice_str = str(r.get("選択肢", "")).strip()
-            allowed = parse_choices(choice_str)
-            meta[norm_qid(qid)] = {"type": typ, "allowed": allowed}
+    master_key = upload_digest(up_master, master_bytes)
+    meta = build_meta(load_master_from_bytes(master_key, master_bytes))
+
+# ⚠ 判定（全回答者 × 全設問を一括で持ち、反映時は変わったセルだけ更新する）
+flag_key = (st.session_state.df_edit_key, id(df_edit), master_key)
+if st.session_state.get("flag_table_key") != flag_key:
+    with perf.stage("⚠ 判定（全件）"):
+        st.session_state.flag_table = FlagTable(df_edit, meta)
+    st.session_state.flag_table_key = flag_key
+flag_table: FlagTable = st.session_state.flag_table
+
+# 回答者番号の索引（CSVが変わったときだけ作り直す）
+resp_index_key = (st.session_state.df_edit_key, id(df_edit))
+if st.session_state.get("resp_index_key") != resp_index_key:
+    st.session_state.resp_index = RespondentIndex(df_edit)
+    st.session_state.resp_index_key = resp_index_key
+resp_index: RespondentIndex = st.session_state.resp_index
 
 # タブ
 tabs = st.tabs(["① ページレビュー", "② 修正キュー", "③ 全体表（参考）", "④ 出力（ダウンロード）"])
@@ -445,7 +577,8 @@ with st.sidebar:
 
     st.divider()
     st.subheader("自動保存（復元）")
-    autosaves = sorted(AUTOSAVE_DIR.glob("*_autosave.csv"), key=lambda p: p.stat().st_mtime, reverse=True)
+    dir_mtime_ns = AUTOSAVE_DIR.stat().st_mtime_ns
+    autosaves = list_autosave_files(dir_mtime_ns, tuple(f"*_autosave{sfx}" for sfx in AUTOSAVE_SUFFIXES))
     if autosaves:
         pick = st.selectbox("復元する自動保存ファイル", autosaves, format_func=lambda p: p.name)
         if st.button("復元する", width="stretch"):
@@ -457,19 +590,23 @@ with st.sidebar:
 
     st.divider()
     st.subheader("作業位置（再開）")
-    pfiles = sorted(AUTOSAVE_DIR.glob(f"{base}_*_progress.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+    pfiles = list_autosave_files(dir_mtime_ns, (f"{base}_*_progress.json",))
 
     if pfiles:
         p_pick = st.selectbox("再開用 progress.json", pfiles, format_func=lambda p: p.name)
         if st.button("▶ 位置を復元して再開", width="stretch"):
             prog = load_progress(p_pick)
+            # progress はスナップショット時点なので、その後の journal（チェック・位置）も足す
+            records = read_journal(prog["autosave_path"]) if prog.get("autosave_path") else []
+            _, prog_checked = replay_journal(pd.DataFrame(columns=["回答者番号"]), records, prog.get("checked", {}))
+            last = records[-1] if records else {}
             st.session_state["pending_restore"] = {
                 "pages_per_resp": prog.get("pages_per_resp", 16),
                 "cover_pages": prog.get("cover_pages", 1),
-                "checked": prog.get("checked", {}),
+                "checked": prog_checked,
                 "autosave_path": prog.get("autosave_path", ""),
-                "current_resp": prog.get("current_resp", ""),
-                "current_page": prog.get("current_page", ""),
+                "current_resp": last.get("resp", prog.get("current_resp", "")),
+                "current_page": last.get("page", prog.get("current_page", "")),
             }
             st.success("作業位置を復元しました。")
             st.rerun()
@@ -495,12 +632,12 @@ with tabs[0]:
                 cp_csv, cp_prog = save_checkpoint(base, df_edit, reason="unsaved")
                 st.success(f"保存しました: {Path(cp_csv).name}")
 
-        resp_list = df_edit["回答者番号"].astype(str).tolist()
+        resp_list = resp_index.ids
         if "current_resp" not in st.session_state:
             st.session_state.current_resp = resp_list[0]
-        if st.session_state.current_resp not in resp_list:
+        if st.session_state.current_resp not in resp_index:
             st.session_state.current_resp = resp_list[0]
-        ridx = resp_list.index(st.session_state.current_resp)
+        ridx = resp_index.position(st.session_state.current_resp)
 
         c1, c2 = st.columns(2)
         with c1:
@@ -530,9 +667,12 @@ with tabs[0]:
         page_no = st.selectbox("設問ページ（論理ページ）", logical_pages, key="current_page", disabled=is_page_dirty)
 
         # 回答者番号が6始まりでもOK：選択順でブロック先頭を計算
-        resp_idx = resp_list.index(str(resp))
-        start_page = resp_idx * int(pages_per_resp)
-        target_page_index = start_page + int(cover_pages) - 1 + int(page_no)
+        def pdf_index_of(r_idx: int, logical: int) -> int:
+            return r_idx * int(pages_per_resp) + int(cover_pages) - 1 + int(logical)
+
+        resp_idx = resp_index.position(resp)
+        start_page = resp_index.pdf_start(resp, pages_per_resp)
+        target_page_index = pdf_index_of(resp_idx, page_no)
 
         st.caption(f"PDFページindex: {target_page_index}（resp_idx={resp_idx}, start={start_page}, cover={cover_pages}, logical={page_no}）")
 
@@ -541,12 +681,13 @@ with tabs[0]:
             st.stop()
 
         qids = [q for q in page_map.get(str(page_no), []) if q in df_edit.columns]
-        rix = df_edit.index[df_edit["回答者番号"].astype(str) == str(resp)][0]
+        rix = resp_index.label(resp)
+        rpos = resp_idx
 
         rows = []
         for qid in qids:
             now = df_edit.at[rix, qid]
-            flg, reason = flag_cell(qid, now, meta)
+            flg, reason = flag_table.cell(rpos, qid)
             rows.append({
                 "設問ID": qid,
                 "現在値": "" if now is None else str(now),
@@ -565,14 +706,15 @@ with tabs[0]:
         def mark_dirty():
             st.session_state.page_dirty = True
 
-        edited = st.data_editor(
-            page_df,
-            key=editor_key,
-            width="stretch",
-            hide_index=True,
-            disabled=["設問ID", "現在値", "⚠", "理由"],
-            on_change=mark_dirty,
-        )
+        with perf.stage("編集表（data_editor）"):
+            edited = st.data_editor(
+                page_df,
+                key=editor_key,
+                width="stretch",
+                hide_index=True,
+                disabled=["設問ID", "現在値", "⚠", "理由"],
+                on_change=mark_dirty,
+            )
         # --- 差分プレビュー（修正値を赤字）: jinja2不要版 ---
         diff_only = edited[edited["修正値"].fillna("") != edited["現在値"].fillna("")][
             ["設問ID", "現在値", "修正値", "⚠", "理由"]
@@ -634,9 +776,18 @@ with tabs[0]:
         )
 
         if apply_clicked:
+            ts = datetime.now().isoformat(timespec="seconds")
+            journal = []
             for _, rr in edited.iterrows():
                 q = rr["設問ID"]
-                df_edit.at[rix, q] = str(rr["修正値"]).strip()
+                old = df_edit.at[rix, q]
+                new = str(rr["修正値"]).strip()
+                df_edit.at[rix, q] = new
+                if new != ("" if old is None else str(old)):
+                    journal.append({"op": "cell", "ts": ts, "resp": str(resp), "page": int(page_no),
+                                    "qid": q, "old": old, "new": new})
+            journal.append({"op": "checked", "ts": ts, "resp": str(resp), "page": int(page_no)})
+            flag_table.update_cells(rpos, {q: df_edit.at[rix, q] for q in edited["設問ID"]})
 
             # チェック済み登録（resp,page）
             resp_key = str(resp)
@@ -652,37 +803,113 @@ with tabs[0]:
             st.session_state.page_dirty = False
             st.session_state.page_dirty_count = 0
 
-            # 反映保存（確定）
-            df_edit.to_csv(st.session_state.autosave_path, index=False, encoding="utf-8-sig")
-            save_progress_file(progress_path_for(base), autosave_path=st.session_state.autosave_path)
+            # 反映保存（確定）：journal に追記し、一定件数ごと（とこのセッション最初の反映時）に全件保存
+            with perf.stage("自動保存"):
+                if st.session_state.get("journal_snapshot") != st.session_state.autosave_path:
+                    compact_autosave(base, df_edit)
+                else:
+                    append_journal(st.session_state.autosave_path, journal)
+                    st.session_state.journal_count = st.session_state.get("journal_count", 0) + len(journal)
+                    if st.session_state.journal_count >= JOURNAL_COMPACT_EVERY:
+                        compact_autosave(base, df_edit)
 
             st.success(f"反映＋自動保存しました：{Path(st.session_state.autosave_path).name}")
             st.rerun()
 
     with colB:
-        st.subheader("ページ全体画像（照合）")
-        full_img = render_page(doc, target_page_index, dpi=int(dpi))
-
-        img_to_show = full_img
-        if show_boxes:
-            page_tpl = template.get("pages", {}).get(str(page_no), {})
-            qid_to_bbox = {qid: page_tpl[qid] for qid in qids if qid in page_tpl}
-            qid_to_value = {qid: df_edit.at[rix, qid] for qid in qids if qid in df_edit.columns}
-
-            img_to_show = draw_overlay_boxes(
-                full_img,
-                qid_to_bbox=qid_to_bbox,
-                qid_to_value=qid_to_value,
-                show_labels=show_labels,
-                show_values=show_values,               # サイドバーのチェック
-                value_font_size=value_font_size,
-                value_alpha=value_alpha,
-                value_max_chars=value_max_chars,
-            )
-        page_w = img_to_show.size[0]
-        page_disp_w = int(page_w * page_zoom / 100)
-
-        st.image(img_to_show, caption=f"ページ全体（PDF index={target_page_index}）", width=page_disp_w)
+        prefetcher = get_prefetcher(pdf_key, pdf_path)
+        page_tpl = template.get("pages", {}).get(str(page_no), {})
+
+        if show_filmstrip:
+            # 低DPIのサムネイルは PageCache に入るので、回答者を行き来しても描き直さない
+            n_flags = page_flag_counts(flag_table, page_map, rpos)
+            checked_here = set(st.session_state.get("checked", {}).get(str(resp), []))
+
+            def goto_page(p: int):
+                st.session_state.current_page = p
+
+            film = st.columns(int(filmstrip_cols))
+            for n, p in enumerate(logical_pages):
+                pi = pdf_index_of(resp_idx, p)
+                if not 0 <= pi < total_pages:
+                    continue
+                with film[n % int(filmstrip_cols)]:
+                    with perf.stage("サムネイル"):
+                        thumb = prefetcher.get_image(doc, pi, int(thumb_dpi), thumb=True)
+                        thumb = badge_thumbnail(thumb, p in checked_here, n_flags.get(p, 0), p == page_no)
+                    st.image(thumb, width="stretch")
+                    label = f"p{p}" + (f" ⚠{n_flags[p]}" if n_flags.get(p) else "")
+                    st.button(
+                        label, key=f"film_{p}", width="stretch",
+                        on_click=goto_page, args=(p,), disabled=is_page_dirty or p == page_no,
+                    )
+            st.divider()
+
+        if view_mode == "設問スニペット":
+            st.subheader("設問スニペット（照合）")
+            # 編集表と同じ順で並べる（⚠ も表に合わせる）
+            flag_of = dict(zip(page_df["設問ID"], page_df["⚠"])) if len(page_df) else {}
+            snip_qids = [qid for qid in qids if qid in page_tpl]
+            grid = st.columns(int(snippet_cols))
+            for n, qid in enumerate(snip_qids):
+                val = df_edit.at[rix, qid]
+                with grid[n % int(snippet_cols)]:
+                    try:
+                        with perf.stage("スニペット"):
+                            snip = prefetcher.get_clip_image(doc, target_page_index, page_tpl[qid], int(snippet_dpi))
+                    except Exception as e:
+                        st.caption(f"{qid}：切り出せません（{e}）")
+                        continue
+                    cap = f"{flag_of.get(qid, '')}{qid}：{'空' if str(val).strip() == '' else val}"
+                    st.image(snip, caption=cap, width="stretch")
+            if not snip_qids:
+                st.caption("このページには template の枠がありません。")
+        else:
+            st.subheader("ページ全体画像（照合）")
+            with perf.stage("ページ画像"):
+                full_img = prefetcher.get_image(doc, target_page_index, int(dpi))
+
+            # 先読み：同じ回答者の次ページ群 ＋ 次の回答者の同じページ
+            page_pos = logical_pages.index(page_no)
+            ahead = [pdf_index_of(resp_idx, p) for p in logical_pages[page_pos + 1:page_pos + 1 + int(prefetch_pages)]]
+            if resp_idx + 1 < len(resp_list):
+                ahead.append(pdf_index_of(resp_idx + 1, page_no))
+            prefetcher.prefetch([i for i in ahead if 0 <= i < total_pages], int(dpi))
+
+            img_to_show = full_img
+            if show_boxes:
+                qid_to_bbox = {qid: page_tpl[qid] for qid in qids if qid in page_tpl}
+                qid_to_value = {qid: df_edit.at[rix, qid] for qid in qids if qid in df_edit.columns}
+
+                with perf.stage("オーバーレイ"):
+                    w, h = full_img.size
+                    layer = cached_overlay_layer(
+                        (tpl_key, ocr_key, str(page_no), int(dpi)), w, h, show_labels, qid_to_bbox
+                    )
+                    img_to_show = draw_overlay_boxes(
+                        full_img,
+                        qid_to_bbox=qid_to_bbox,
+                        qid_to_value=qid_to_value,
+                        show_labels=show_labels,
+                        show_values=show_values,               # サイドバーのチェック
+                        value_font_size=value_font_size,
+                        value_alpha=value_alpha,
+                        value_max_chars=value_max_chars,
+                        layer=layer,
+                    )
+            page_w = img_to_show.size[0]
+            page_disp_w = int(page_w * page_zoom / 100)
+
+            st.image(img_to_show, caption=f"ページ全体（PDF index={target_page_index}）", width=page_disp_w)
+
+        cs = get_page_cache().stats()
+        cache_stats_box.caption(
+            f"{cs['entries']}枚 / {cs['bytes'] / 2**20:.0f}MB（上限 {cs['max_bytes'] / 2**20:.0f}MB, {cs['format']}）  \n"
+            f"ヒット {cs['hits']} / ミス {cs['misses']} / 追い出し {cs['evictions']}"
+            f"（サムネイル: ヒット {cs['thumb_hits']} / ミス {cs['thumb_misses']}、"
+            f"スニペット: ヒット {cs['clip_hits']} / ミス {cs['clip_misses']}）  \n"
+            f"書き出し済み画像（{int(dpi)}dpi）: {prefetcher.store.count(int(dpi))}枚"
+        )
 
 # =========================
 # ② 修正キュー（未チェックのみ）
@@ -691,43 +918,91 @@ with tabs[1]:
     st.subheader("修正キュー（要確認セル：未チェックページのみ）")
     st.caption("⚠ 判定のうち、まだチェックしていないページ由来だけを表示します。")
 
-    resp_list = df_edit["回答者番号"].astype(str).tolist()
-    q_resp = st.selectbox("対象回答者（キュー）", resp_list, key="queue_resp")
-
     checked = st.session_state.get("checked", {})
-    checked_pages = set(checked.get(str(q_resp), []))
+    queue_scope = st.radio("表示範囲", ["回答者ごと", "全回答者"], horizontal=True, key="queue_scope")
 
-    rix = df_edit.index[df_edit["回答者番号"].astype(str) == str(q_resp)][0]
+    if queue_scope == "回答者ごと":
+        q_resp = st.selectbox("対象回答者（キュー）", resp_index.ids, key="queue_resp")
 
-    qid_to_page = {}
-    for pno, qids in page_map.items():
-        for q in qids:
-            if q not in qid_to_page:
-                qid_to_page[q] = int(pno)
+        checked_pages = set(checked.get(str(q_resp), []))
 
-    queue_rows = []
-    for col in df_edit.columns:
-        if col == "回答者番号":
-            continue
-        val = df_edit.at[rix, col]
-        flg, reason = flag_cell(col, val, meta)
-        if not flg:
-            continue
-        page_of_q = qid_to_page.get(col, None)
-        if page_of_q is not None and page_of_q in checked_pages:
-            continue
-        queue_rows.append({
-            "設問ID": col,
-            "ページ": page_of_q if page_of_q is not None else "",
-            "現在値": val,
-            "理由": reason,
-        })
+        rix = resp_index.label(q_resp)
+        rpos = resp_index.position(q_resp)
+
+        fc = flag_table.flagged_cells(rpos)
+        queue_rows = []
+        for col, reason in zip(fc["設問ID"], fc["理由"]):
+            val = df_edit.at[rix, col]
+            page_of_q = qid_to_page.get(col, None)
+            if page_of_q is not None and page_of_q in checked_pages:
+                continue
+            queue_rows.append({
+                "設問ID": col,
+                "ページ": page_of_q if page_of_q is not None else "",
+                "現在値": val,
+                "理由": reason,
+            })
+
+        if queue_rows:
+            qdf = pd.DataFrame(queue_rows).sort_values(["ページ", "設問ID"])
+            st.dataframe(qdf, width="stretch", height=460)
+        else:
+            st.success("未チェックの要確認はありません。")
 
-    if queue_rows:
-        qdf = pd.DataFrame(queue_rows).sort_values(["ページ", "設問ID"])
-        st.dataframe(qdf, width="stretch", height=460)
     else:
-        st.success("未チェックの要確認はありません。")
+        with perf.stage("修正キュー（全回答者）"):
+            gq = build_global_queue(flag_table, resp_index, df_edit, qid_to_page, checked)
+
+        f1, f2, f3 = st.columns(3)
+        with f1:
+            pick_pages = st.multiselect("ページ", sorted(gq["ページ"].dropna().unique().tolist()))
+        with f2:
+            pick_qids = st.multiselect("設問ID", sorted(gq["設問ID"].unique().tolist()))
+        with f3:
+            pick_reasons = st.multiselect("理由", [REASON_LABELS[c] for c in REASON_LABELS if c])
+        sort_by = st.selectbox(
+            "並び順",
+            ["ページ → 設問ID → 回答者", "設問ID → 回答者", "理由 → ページ → 設問ID"],
+        )
+
+        if pick_pages:
+            gq = gq[gq["ページ"].isin(pick_pages)]
+        if pick_qids:
+            gq = gq[gq["設問ID"].isin(pick_qids)]
+        if pick_reasons:
+            gq = gq[gq["理由区分"].isin(pick_reasons)]
+        sort_cols = {
+            "ページ → 設問ID → 回答者": ["ページ", "設問ID", "row"],
+            "設問ID → 回答者": ["設問ID", "row"],
+            "理由 → ページ → 設問ID": ["理由区分", "ページ", "設問ID", "row"],
+        }[sort_by]
+        gq = gq.sort_values(sort_cols, kind="stable")
+
+        max_rows = 5000
+        st.caption(f"{len(gq)}件" + (f"（先頭 {max_rows} 件を表示）" if len(gq) > max_rows else ""))
+        view = gq.head(max_rows).drop(columns=["row"]).reset_index(drop=True)
+        event = st.dataframe(
+            view, width="stretch", height=460, hide_index=True,
+            on_select="rerun", selection_mode="single-row", key="global_queue_table",
+        )
+
+        sel_rows = event.selection.rows if event is not None else []
+        if sel_rows:
+            target = view.iloc[sel_rows[0]]
+            can_jump = pd.notna(target["ページ"]) and not st.session_state.get("page_dirty", False)
+            if st.button(
+                f"▶ 回答者 {target['回答者番号']} / ページ {target['ページ']} を①で開く",
+                width="stretch", disabled=not can_jump,
+            ):
+                st.session_state["pending_jump"] = {
+                    "current_resp": str(target["回答者番号"]),
+                    "current_page": int(target["ページ"]),
+                }
+                st.rerun()
+            st.caption("移動後は「① ページレビュー」タブを開いてください。未反映の修正があるときは移動できません。")
+
+    with st.expander("全回答者の ⚠ 件数（理由別）", expanded=False):
+        st.dataframe(flag_table.summary(), width="stretch", hide_index=True)
 
 # =========================
 # ③ 全体表（参考）
@@ -743,20 +1018,38 @@ with tabs[3]:
     st.subheader("修正後CSVの出力")
     st.write("編集中:", "✅" if st.session_state.get("dirty", False) else "（変更なし）")
 
+    out_fmt = "csv"
+    if len(AVAILABLE_FORMATS) > 1:
+        out_fmt = st.radio(
+            "出力形式", AVAILABLE_FORMATS, format_func=TABLE_LABELS.get, horizontal=True,
+            help="Parquet / Feather は文字列を辞書エンコードして書くので小さく、pandas や Arrow からすぐ読み込めます。",
+        )
     datestr = datetime.now().strftime("%Y%m%d")
-    out_name = f"{base}_{datestr}.csv"
+    out_name = f"{base}_{datestr}{TABLE_SUFFIXES[out_fmt]}"
 
-    csv_bytes = df_edit.to_csv(index=False).encode("utf-8-sig")
+    with perf.stage(f"出力（{TABLE_LABELS[out_fmt]}）"):
+        out_bytes = table_to_bytes(df_edit, out_fmt)
     st.download_button(
-        label=f"修正後CSVをダウンロード（{out_name}）",
-        data=csv_bytes,
+        label=f"修正後{TABLE_LABELS[out_fmt]}をダウンロード（{out_name}）",
+        data=out_bytes,
         file_name=out_name,
-        mime="text/csv",
+        mime=TABLE_MIMES[out_fmt],
     )
 
-
-
-
-
-
-
+# =========================
+# 計測結果（サイドバー）
+# =========================
+stop_profiler()
+perf.end_run()
+if PERF_ENABLED:
+    with perf_box:
+        st.dataframe(pd.DataFrame(perf.summary()), width="stretch", hide_index=True)
+        st.download_button(
+            "計測結果（JSON）", data=perf.to_json().encode("utf-8"),
+            file_name=f"perf_{datetime.now():%Y%m%d_%H%M%S}.json", mime="application/json",
+            width="stretch",
+        )
+        prof = st.session_state.get("perf_profile")
+        if prof:
+            with st.expander(f"直近のプロファイル（{prof['kind']}）"):
+                st.code(prof["report"], language="text")
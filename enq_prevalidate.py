@@ -0,0 +1,152 @@
+"""
+OCR CSV の ⚠ 判定をまとめて先に済ませるコマンドラインツール（Streamlit 不要）。
+
+レビュアーで開く前に、どの回答者のどのページを見ればよいかの作業リストを作る。
+
+    python enq_prevalidate.py --ocr ocr.csv --template template.json [--master master.csv] \
+        [--pdf scan.pdf] [--out prevalidate_out] [--workers 4]
+
+出力（--out 配下）:
+- worklist.csv : 回答者 × ページごとの ⚠ 件数・設問ID・理由別件数（⚠ のある行のみ）
+- flags.csv    : ⚠ セルの一覧（回答者番号, ページ, 設問ID, 理由コード, 理由）
+- summary.json : 理由別・ページ別・設問別の件数
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from enq_core.validate import (
+    REASON_LABELS, FlagTable, build_meta, build_qid_to_page, read_master_csv, read_ocr_csv,
+)
+
+ID_COL = "回答者番号"
+
+# =========================
+# Worker
+# =========================
+
+def _flag_chunk(args) -> pd.DataFrame:
+    """回答者の行ブロック1つを判定し、⚠ セルを返す（row は df 全体での位置）。"""
+    start, chunk, meta = args
+    cells = FlagTable(chunk, meta, id_col=ID_COL).flagged_cells()
+    cells["row"] += start
+    return cells
+
+def flag_all(df: pd.DataFrame, meta: dict, workers: int = 1, chunk_size: int = 500) -> pd.DataFrame:
+    chunk_size = max(1, int(chunk_size))
+    jobs = [(s, df.iloc[s:s + chunk_size], meta) for s in range(0, len(df), chunk_size)]
+    if workers <= 1 or len(jobs) <= 1:
+        parts = [_flag_chunk(j) for j in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            parts = list(ex.map(_flag_chunk, jobs))
+    if not parts:
+        return pd.DataFrame({"row": [], "設問ID": [], "code": [], "理由": []})
+    return pd.concat(parts, ignore_index=True)
+
+# =========================
+# Reports
+# =========================
+
+def build_reports(df: pd.DataFrame, cells: pd.DataFrame, qid_to_page: dict,
+                  pages_per_resp: int, cover_pages: int):
+    """⚠ セル一覧から flags（縦長）と worklist（回答者×ページ）を作る。"""
+    flags = pd.DataFrame({
+        ID_COL: df[ID_COL].to_numpy()[cells["row"].to_numpy(dtype=int)],
+        "ページ": cells["設問ID"].map(qid_to_page).astype("Int64"),
+        "設問ID": cells["設問ID"],
+        "code": cells["code"].astype(int),
+        "理由": cells["理由"],
+        "row": cells["row"].astype(int),
+    })
+    # テンプレに載っていない列はページに割り当てられないので作業リストからは外す
+    paged = flags.dropna(subset=["ページ"])
+    if paged.empty:
+        worklist = pd.DataFrame(columns=[ID_COL, "ページ", "PDFページindex", "⚠件数", "設問ID"])
+    else:
+        keys = ["row", ID_COL, "ページ"]
+        worklist = paged.groupby(keys, sort=True).agg(
+            **{"⚠件数": ("設問ID", "size"), "設問ID": ("設問ID", lambda s: ",".join(s))}
+        )
+        by_reason = paged.pivot_table(index=keys, columns="code", values="設問ID", aggfunc="size", fill_value=0)
+        by_reason.columns = [REASON_LABELS[int(c)] for c in by_reason.columns]
+        worklist = worklist.join(by_reason).reset_index()
+        worklist.insert(
+            3, "PDFページindex",
+            worklist["row"] * int(pages_per_resp) + int(cover_pages) - 1 + worklist["ページ"].astype(int),
+        )
+        worklist = worklist.drop(columns="row")
+    return flags.drop(columns="row"), worklist
+
+def build_summary(df: pd.DataFrame, flags: pd.DataFrame, worklist: pd.DataFrame) -> dict:
+    by_reason = flags["code"].value_counts()
+    return {
+        "respondents": int(len(df)),
+        "questions": int(len(df.columns) - 1),
+        "flagged_cells": int(len(flags)),
+        "flagged_respondents": int(flags[ID_COL].nunique()),
+        "pages_to_review": int(len(worklist)),
+        "by_reason": {REASON_LABELS[int(c)]: int(n) for c, n in by_reason.sort_index().items()},
+        "by_page": {str(int(p)): int(n) for p, n in flags["ページ"].dropna().value_counts().sort_index().items()},
+        "by_question": {str(q): int(n) for q, n in flags["設問ID"].value_counts().items()},
+    }
+
+# =========================
+# Main
+# =========================
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="OCR CSV の ⚠ 判定を一括で行い、確認作業リストを出力する")
+    ap.add_argument("--ocr", required=True, help="OCR出力CSV（Parquet / Feather も可）")
+    ap.add_argument("--template", required=True, help="template.json")
+    ap.add_argument("--master", default=None, help="設問マスタCSV（省略時はOCRの値だけで判定：レビュアーと同じ）")
+    ap.add_argument("--pdf", help="回答PDF（ページ数の整合チェックのみ）")
+    ap.add_argument("--pages-per-resp", type=int, default=16, help="1人あたりページ数（表紙含む）")
+    ap.add_argument("--cover-pages", type=int, default=1, help="表紙ページ数")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="並列プロセス数")
+    ap.add_argument("--chunk-size", type=int, default=500, help="1プロセスに渡す回答者数")
+    ap.add_argument("--out", default="prevalidate_out", help="出力ディレクトリ")
+    args = ap.parse_args(argv)
+
+    df = read_ocr_csv(args.ocr)
+    template = json.loads(Path(args.template).read_text(encoding="utf-8"))
+    meta = build_meta(read_master_csv(args.master)) if args.master else {}
+    qid_to_page = build_qid_to_page(template)
+
+    if args.pdf:
+        import fitz  # PyMuPDF
+
+        with fitz.open(args.pdf) as doc:
+            total_pages = len(doc)
+        need = len(df) * args.pages_per_resp
+        if need > total_pages:
+            print(
+                f"警告: 回答者 {len(df)} 人 × {args.pages_per_resp} ページ = {need} ページに対し、"
+                f"PDFは {total_pages} ページです。pages-per-resp を見直してください。",
+                file=sys.stderr,
+            )
+
+    cells = flag_all(df, meta, workers=args.workers, chunk_size=args.chunk_size)
+    flags, worklist = build_reports(df, cells, qid_to_page, args.pages_per_resp, args.cover_pages)
+    summary = build_summary(df, flags, worklist)
+
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    worklist.to_csv(out / "worklist.csv", index=False, encoding="utf-8-sig")
+    flags.to_csv(out / "flags.csv", index=False, encoding="utf-8-sig")
+    (out / "summary.json").write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    print(f"回答者 {summary['respondents']} 人 / ⚠ {summary['flagged_cells']} 件"
+          f"（{summary['flagged_respondents']} 人・{summary['pages_to_review']} ページ）")
+    for label, n in summary["by_reason"].items():
+        print(f"  {label}: {n}")
+    print(f"出力: {out.resolve()}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,4 @@
 import streamlit as st
-import io
-import re
 
 st.set_page_config(page_title="Markdown見出し抽出ツール", layout="wide")
 
@@ -11,26 +9,14 @@ st.write("アップロードされたファイルから `#` で始まる行（
 uploaded_file = st.file_uploader("Markdownファイルをアップロードしてください", type=["md", "txt"])
 
 if uploaded_file is not None:
+    # enq_core.markdown は pandas を読み込むのでアップロード後に import する
+    from enq_core.markdown import extract_headings
+
     # ファイル内容の読み込み
     content = uploaded_file.getvalue().decode("utf-8")
     
-    # 2. 抽出ロジック
-    # YAMLブロックなどのコードブロック内にある # を無視するため、
-    # 1行ずつ判定する際に「コードブロック外であること」を考慮します
-    lines = content.splitlines()
-    extracted_headings = []
-    is_inside_code_block = False
-
-    for line in lines:
-        # コードブロック（```）の開始・終了を判定
-        if line.strip().startswith("```"):
-            is_inside_code_block = not is_inside_code_block
-            continue
-        
-        # コードブロック外で、かつ # で始まる行を抽出
-        if not is_inside_code_block:
-            if line.strip().startswith("#"):
-                extracted_headings.append(line)
+    # 2. 抽出（コードブロック内の # は無視）
+    extracted_headings = extract_headings(content)
 
     # 3. 結果の表示
     if extracted_headings:
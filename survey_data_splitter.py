@@ -1,7 +1,4 @@
 import streamlit as st
-import pandas as pd
-import re
-import io
 
 st.set_page_config(page_title="アンケートデータ分割ツール", layout="wide")
 
@@ -15,6 +12,81 @@ st.markdown("""
 uploaded_file = st.file_uploader("CSVファイルをアップロード", type=['csv'])
 
 if uploaded_file is not None:
+    # pandas などの重いモジュールはアップロード後に読み込む（起動直後の初回表示を速くする）
+    import pandas as pd
+
+    from enq_core.splitters import (
+        CHUNK_ROWS, SPLIT_WORKERS, STREAM_THRESHOLD_MB, read_csv_chunks, split_number_text, stream_output_paths,
+        stream_split_number_text,
+    )
+    from enq_core.tableio import (
+        AVAILABLE_FORMATS, TABLE_LABELS, TABLE_MIMES, TABLE_SUFFIXES, read_table, table_to_bytes,
+    )
+
+    # 大きなCSVはチャンクごとに読み込んで処理し、結果はファイルに書き出す（メモリ使用量が入力の大きさによらない）
+    stream = st.checkbox(
+        "分割読み込み（大きなCSV向け）",
+        value=uploaded_file.size > STREAM_THRESHOLD_MB * 1024 * 1024,
+        help=f"{CHUNK_ROWS:,}行ずつ処理します。{STREAM_THRESHOLD_MB}MBを超えるファイルは最初からオンになります。",
+    )
+    # 出力形式（pyarrow が入っていれば Parquet / Feather も選べる）
+    out_fmt = "csv"
+    if len(AVAILABLE_FORMATS) > 1:
+        out_fmt = st.radio(
+            "出力形式", AVAILABLE_FORMATS, format_func=TABLE_LABELS.get, horizontal=True,
+            help="Parquet / Feather は文字列を辞書エンコードして書くので小さく、pandas や Arrow からすぐ読み込めます。",
+        )
+    if stream:
+        encoding = 'utf-8-sig'
+        try:
+            uploaded_file.seek(0)
+            head = pd.read_csv(uploaded_file, encoding=encoding, dtype=str, nrows=100)
+        except Exception as e:
+            st.error(f"ファイルの読み込みエラー: {e}")
+            st.stop()
+        with st.expander("📄 元のデータ（先頭100行）を表示", expanded=False):
+            st.dataframe(head, use_container_width=True)
+
+        if st.button("🔄 データを処理する", type="primary"):
+            out_path, info_path = stream_output_paths(uploaded_file.name, out_fmt)
+            try:
+                with st.spinner("処理中..."):
+                    n_rows, n_split = stream_split_number_text(
+                        lambda: read_csv_chunks(uploaded_file, encoding), out_path, ":", info_path,
+                        workers=SPLIT_WORKERS, fmt=out_fmt,
+                    )
+            except Exception as e:
+                st.error(f"処理中にエラーが発生しました: {e}")
+                st.stop()
+
+            st.success(f"✅ 処理完了: {n_rows}行のうち {n_split}個のセルを分割しました")
+            if n_split:
+                with st.expander(f"🔍 分割されたセルの詳細（先頭1000件 / {n_split}件）", expanded=True):
+                    st.dataframe(read_table(info_path, nrows=1000), use_container_width=True)
+
+            # ダウンロードはクリックされたときにファイルから読む（再実行しない）
+            st.markdown("---")
+            col1, col2 = st.columns(2)
+            with col1:
+                st.download_button(
+                    label=f"📥 処理済み{TABLE_LABELS[out_fmt]}をダウンロード",
+                    data=out_path.read_bytes,
+                    file_name=f"processed_data{TABLE_SUFFIXES[out_fmt]}",
+                    mime=TABLE_MIMES[out_fmt],
+                    type="primary",
+                    on_click="ignore",
+                )
+            with col2:
+                if n_split:
+                    st.download_button(
+                        label=f"📥 分割情報{TABLE_LABELS[out_fmt]}をダウンロード",
+                        data=info_path.read_bytes,
+                        file_name=f"split_info{TABLE_SUFFIXES[out_fmt]}",
+                        mime=TABLE_MIMES[out_fmt],
+                        on_click="ignore",
+                    )
+        st.stop()
+
     # CSVファイルを読み込み
     try:
         df = pd.read_csv(uploaded_file, encoding='utf-8-sig')
@@ -30,66 +102,8 @@ if uploaded_file is not None:
     # 処理ボタン
     if st.button("🔄 データを処理する", type="primary"):
         with st.spinner("処理中..."):
-            # 分割されたセルを記録
-            split_info = []
-            
-            # 新しいデータフレームを作成（元のデータをコピー）
-            df_processed = df.copy()
-            
-            # 各列を処理
-            new_columns_data = {}  # 新しい列のデータを保存
-            
-            for col in df.columns:
-                # 新しい列のデータ初期化
-                text_column_data = [None] * len(df)
-                has_split = False
-                
-                # 各行を処理
-                for idx, value in enumerate(df[col]):
-                    if pd.isna(value):
-                        continue
-                    
-                    value_str = str(value)
-                    
-                    # ":"を含むかチェック
-                    if ':' in value_str:
-                        # ":"で分割
-                        parts = value_str.split(':', 1)
-                        
-                        if len(parts) == 2:
-                            left_part = parts[0].strip()
-                            right_part = parts[1].strip()
-                            
-                            # 左側が数値またはコンマ区切りの数値かチェック
-                            # 例: "14", "6,12", "1,2,3"
-                            if re.match(r'^[\d,\s]+$', left_part):
-                                # 分割を実行
-                                df_processed.at[idx, col] = left_part
-                                text_column_data[idx] = right_part
-                                has_split = True
-                                
-                                # 分割情報を記録
-                                split_info.append({
-                                    '行': idx + 2,  # ヘッダー行を考慮して+2
-                                    '列': col,
-                                    '元の値': value_str[:50] + '...' if len(value_str) > 50 else value_str,
-                                    '数値部分': left_part,
-                                    'テキスト部分': right_part[:50] + '...' if len(right_part) > 50 else right_part
-                                })
-                
-                # この列で分割があった場合、新しい列を追加
-                if has_split:
-                    new_col_name = f"{col}_テキスト"
-                    new_columns_data[new_col_name] = text_column_data
-            
-            # 新しい列を元の列の右隣に挿入
-            for col in df.columns:
-                new_col_name = f"{col}_テキスト"
-                if new_col_name in new_columns_data:
-                    # 元の列の位置を取得
-                    col_idx = df_processed.columns.get_loc(col)
-                    # 新しい列を挿入
-                    df_processed.insert(col_idx + 1, new_col_name, new_columns_data[new_col_name])
+            # 「数値:テキスト」のセルを分割（分割したセルは split_info に記録）
+            df_processed, split_info = split_number_text(df, ":", workers=SPLIT_WORKERS)
         
         # 処理結果を表示
         st.success(f"✅ 処理完了: {len(split_info)}個のセルを分割しました")
@@ -111,31 +125,27 @@ if uploaded_file is not None:
         col1, col2 = st.columns(2)
         
         with col1:
-            # 処理後のCSVをダウンロード
-            csv_buffer = io.StringIO()
-            df_processed.to_csv(csv_buffer, index=False, encoding='utf-8-sig')
-            csv_data = csv_buffer.getvalue().encode('utf-8-sig')
+            # 処理後のデータをダウンロード
+            out_data = table_to_bytes(df_processed, out_fmt)
             
             st.download_button(
-                label="📥 処理済みCSVをダウンロード",
-                data=csv_data,
-                file_name="processed_data.csv",
-                mime="text/csv",
+                label=f"📥 処理済み{TABLE_LABELS[out_fmt]}をダウンロード",
+                data=out_data,
+                file_name=f"processed_data{TABLE_SUFFIXES[out_fmt]}",
+                mime=TABLE_MIMES[out_fmt],
                 type="primary"
             )
         
         with col2:
             # 分割情報をダウンロード
             if split_info:
-                split_csv_buffer = io.StringIO()
-                split_df.to_csv(split_csv_buffer, index=False, encoding='utf-8-sig')
-                split_csv_data = split_csv_buffer.getvalue().encode('utf-8-sig')
+                split_data = table_to_bytes(split_df, out_fmt)
                 
                 st.download_button(
-                    label="📥 分割情報CSVをダウンロード",
-                    data=split_csv_data,
-                    file_name="split_info.csv",
-                    mime="text/csv"
+                    label=f"📥 分割情報{TABLE_LABELS[out_fmt]}をダウンロード",
+                    data=split_data,
+                    file_name=f"split_info{TABLE_SUFFIXES[out_fmt]}",
+                    mime=TABLE_MIMES[out_fmt]
                 )
 
 else:
@@ -1,7 +1,4 @@
 import streamlit as st
-import pandas as pd
-import io
-import chardet
 
 st.set_page_config(page_title="アンケートデータ分割ツール", layout="wide")
 
@@ -15,13 +12,99 @@ st.markdown("""
 uploaded_file = st.file_uploader("CSVファイルをアップロード", type=['csv'])
 
 if uploaded_file is not None:
+    # pandas などの重いモジュールはアップロード後に読み込む（起動直後の初回表示を速くする）
+    import pandas as pd
+
+    from enq_core.encoding import detect_encoding
+    from enq_core.splitters import (
+        CHUNK_ROWS, DUMMY_MAX_OPTIONS, SPLIT_WORKERS, STREAM_THRESHOLD_MB, dummy_multi_answers, read_csv_auto,
+        read_csv_chunks, split_multi_answers, stream_dummy_multi_answers, stream_output_paths,
+        stream_split_multi_answers,
+    )
+    from enq_core.tableio import (
+        AVAILABLE_FORMATS, TABLE_LABELS, TABLE_MIMES, TABLE_SUFFIXES, read_table, table_to_bytes,
+    )
+
+    # 大きなCSVはチャンクごとに読み込んで処理し、結果はファイルに書き出す（メモリ使用量が入力の大きさによらない）
+    stream = st.checkbox(
+        "分割読み込み（大きなCSV向け）",
+        value=uploaded_file.size > STREAM_THRESHOLD_MB * 1024 * 1024,
+        help=f"{CHUNK_ROWS:,}行ずつ処理します。{STREAM_THRESHOLD_MB}MBを超えるファイルは最初からオンになります。",
+    )
+    # 出力形式（pyarrow が入っていれば Parquet / Feather も選べる）
+    out_fmt = "csv"
+    if len(AVAILABLE_FORMATS) > 1:
+        out_fmt = st.radio(
+            "出力形式", AVAILABLE_FORMATS, format_func=TABLE_LABELS.get, horizontal=True,
+            help="Parquet / Feather は文字列を辞書エンコードして書くので小さく、pandas や Arrow からすぐ読み込めます。",
+        )
+    # 展開のしかた：回答の順に 列名_1, 列名_2, ...（従来）か、選択肢ごとの 0/1 列（集計・クロス集計向け）
+    dummy = st.radio(
+        "展開のしかた", [False, True], horizontal=True,
+        format_func=lambda d: "選択肢ごとの 0/1 列（列名_選択肢）" if d else "回答の順に 列名_1, 列名_2, ...",
+        help=(
+            "0/1 列は数値なのでそのまま集計に使えます。無回答の行は 0 ではなく空欄になります。"
+            f"選択肢が{DUMMY_MAX_OPTIONS}を超える列（自由記述など）は展開しません。"
+        ),
+    )
+    split = dummy_multi_answers if dummy else split_multi_answers
+    stream_split = stream_dummy_multi_answers if dummy else stream_split_multi_answers
+    if stream:
+        try:
+            encoding, confidence = detect_encoding(uploaded_file.getbuffer())  # コピーせずに BOM・UTF-8 の確認と先頭・中央・末尾の抜き取りで判定
+            st.info(f"🔍 文字コード自動判定: {encoding}（信頼度: {confidence:.0%}）")
+            uploaded_file.seek(0)
+            head = pd.read_csv(uploaded_file, encoding=encoding, dtype=str, nrows=100)
+        except Exception as e:
+            st.error(f"ファイルの読み込みエラー: {e}")
+            st.stop()
+        with st.expander("📄 元のデータ（先頭100行）を表示", expanded=False):
+            st.dataframe(head, use_container_width=True)
+
+        if st.button("🔄 データを処理する", type="primary"):
+            out_path, info_path = stream_output_paths(uploaded_file.name, out_fmt)
+            try:
+                with st.spinner("処理中..."):
+                    n_rows, n_split = stream_split(
+                        lambda: read_csv_chunks(uploaded_file, encoding), out_path, ";", info_path,
+                        workers=SPLIT_WORKERS, fmt=out_fmt,
+                    )
+            except Exception as e:
+                st.error(f"処理中にエラーが発生しました: {e}")
+                st.stop()
+
+            st.success(f"✅ 処理完了: {n_rows}行のうち {n_split}件のセルを分割しました")
+            if n_split:
+                with st.expander(f"🔍 分割されたセルの詳細（先頭1000件 / {n_split}件）", expanded=True):
+                    st.dataframe(read_table(info_path, nrows=1000), use_container_width=True)
+
+            # ダウンロードはクリックされたときにファイルから読む（再実行しない）
+            st.markdown("---")
+            col1, col2 = st.columns(2)
+            with col1:
+                st.download_button(
+                    label=f"📥 処理済み{TABLE_LABELS[out_fmt]}をダウンロード",
+                    data=out_path.read_bytes,
+                    file_name=f"processed_data{TABLE_SUFFIXES[out_fmt]}",
+                    mime=TABLE_MIMES[out_fmt],
+                    type="primary",
+                    on_click="ignore",
+                )
+            with col2:
+                if n_split:
+                    st.download_button(
+                        label=f"📥 分割情報{TABLE_LABELS[out_fmt]}をダウンロード",
+                        data=info_path.read_bytes,
+                        file_name=f"split_info{TABLE_SUFFIXES[out_fmt]}",
+                        mime=TABLE_MIMES[out_fmt],
+                        on_click="ignore",
+                    )
+        st.stop()
+
     # 文字コードを自動判定して読み込み
     try:
-        raw_data = uploaded_file.read()
-        detected = chardet.detect(raw_data)
-        encoding = detected['encoding'] or 'cp932'
-        st.info(f"🔍 文字コード自動判定: {encoding}（信頼度: {detected['confidence']:.0%}）")
-        df = pd.read_csv(io.BytesIO(raw_data), encoding=encoding)
+        df, encoding, confidence = read_csv_auto(uploaded_file.read())
+        st.info(f"🔍 文字コード自動判定: {encoding}（信頼度: {confidence:.0%}）")
         st.success(f"✅ ファイルを読み込みました: {df.shape[0]}行 × {df.shape[1]}列")
     except Exception as e:
         st.error(f"ファイルの読み込みエラー: {e}")
@@ -33,56 +116,13 @@ if uploaded_file is not None:
 
     # 処理ボタン
     if st.button("🔄 データを処理する", type="primary"):
-        with st.spinner("処理中..."):
-            split_info = []
-            df_processed = df.copy()
-            insert_plan = []  # (元列名, 追加列名リスト, col_data)
-
-            for col in df.columns:
-                # 最大分割数を確認
-                max_parts = 1
-                for value in df[col]:
-                    if pd.isna(value):
-                        continue
-                    value_str = str(value)
-                    if ';' in value_str:
-                        n = len(value_str.split(';'))
-                        if n > max_parts:
-                            max_parts = n
-
-                if max_parts <= 1:
-                    continue  # この列には「;」なし
-
-                # 追加列の名前を生成（例: Q1_1, Q1_2, ...）
-                new_col_names = [f"{col}_{i+1}" for i in range(max_parts)]
-                col_data = {name: [None] * len(df) for name in new_col_names}
-
-                for idx, value in enumerate(df[col]):
-                    if pd.isna(value):
-                        continue
-                    value_str = str(value)
-                    if ';' not in value_str:
-                        col_data[new_col_names[0]][idx] = value_str.strip()
-                        continue
-
-                    parts = [p.strip() for p in value_str.split(';')]
-                    for i, part in enumerate(parts):
-                        col_data[new_col_names[i]][idx] = part
-
-                    split_info.append({
-                        '行': idx + 2,
-                        '列': col,
-                        '元の値': value_str[:80] + '...' if len(value_str) > 80 else value_str,
-                        '分割数': len(parts),
-                    })
-
-                insert_plan.append((col, new_col_names, col_data))
-
-            # 元の列の右隣に順番に挿入
-            for col, new_col_names, col_data in insert_plan:
-                base_idx = df_processed.columns.get_loc(col)
-                for offset, new_col_name in enumerate(new_col_names):
-                    df_processed.insert(base_idx + 1 + offset, new_col_name, col_data[new_col_name])
+        try:
+            with st.spinner("処理中..."):
+                df_processed, split_info = split(df, ";", workers=SPLIT_WORKERS)
+        except ValueError as e:
+            # 0/1 列の列名（列名_選択肢）が元からある列と重なったとき
+            st.error(f"{e}\n\n展開のしかたで「回答の順に 列名_1, 列名_2, ...」を選ぶか、重なっている列の名前を変えてください。")
+            st.stop()
 
         # 処理結果を表示
         st.success(f"✅ 処理完了: {len(split_info)}件のセルを分割しました")
@@ -101,27 +141,23 @@ if uploaded_file is not None:
         col1, col2 = st.columns(2)
 
         with col1:
-            csv_buffer = io.StringIO()
-            df_processed.to_csv(csv_buffer, index=False, encoding='utf-8-sig')
-            csv_data = csv_buffer.getvalue().encode('utf-8-sig')
+            out_data = table_to_bytes(df_processed, out_fmt)
             st.download_button(
-                label="📥 処理済みCSVをダウンロード",
-                data=csv_data,
-                file_name="processed_data.csv",
-                mime="text/csv",
+                label=f"📥 処理済み{TABLE_LABELS[out_fmt]}をダウンロード",
+                data=out_data,
+                file_name=f"processed_data{TABLE_SUFFIXES[out_fmt]}",
+                mime=TABLE_MIMES[out_fmt],
                 type="primary"
             )
 
         with col2:
             if split_info:
-                split_csv_buffer = io.StringIO()
-                split_df.to_csv(split_csv_buffer, index=False, encoding='utf-8-sig')
-                split_csv_data = split_csv_buffer.getvalue().encode('utf-8-sig')
+                split_data = table_to_bytes(split_df, out_fmt)
                 st.download_button(
-                    label="📥 分割情報CSVをダウンロード",
-                    data=split_csv_data,
-                    file_name="split_info.csv",
-                    mime="text/csv"
+                    label=f"📥 分割情報{TABLE_LABELS[out_fmt]}をダウンロード",
+                    data=split_data,
+                    file_name=f"split_info{TABLE_SUFFIXES[out_fmt]}",
+                    mime=TABLE_MIMES[out_fmt]
                 )
 
 else:
@@ -136,6 +172,9 @@ else:
         3. **分割処理**: 「;」で分割し、選択肢ごとに別列（列名_1, 列名_2, ...）を生成
         4. **新しい列**: 元の列の右隣に順番に挿入
 
+        「選択肢ごとの 0/1 列」を選ぶと、回答の順ではなく選択肢ごとに「列名_選択肢」の列を作り、
+        選んだ人を 1、それ以外を 0 にします（無回答の人は空欄。集計・クロス集計にそのまま使えます）。
+
         ### 使用例
 
         **元のデータ（387:checkbox 列）:**